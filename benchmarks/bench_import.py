@@ -0,0 +1,39 @@
+"""Measure how long ``import urwid_readline`` takes in a fresh interpreter.
+
+Usage: python benchmarks/bench_import.py [runs]
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+
+def _time_import(statement):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    baseline = [_time_import("pass") for _ in range(runs)]
+    package = [_time_import("import urwid_readline") for _ in range(runs)]
+    widget = [
+        _time_import("from urwid_readline import ReadlineEdit")
+        for _ in range(runs)
+    ]
+    base = statistics.median(baseline)
+    print("interpreter startup:       %7.2f ms" % (base * 1000))
+    for label, samples in [
+        ("import urwid_readline", package),
+        ("import ReadlineEdit", widget),
+    ]:
+        print(
+            "%-26s %7.2f ms"
+            % (label + ":", (statistics.median(samples) - base) * 1000)
+        )
+
+
+if __name__ == "__main__":
+    main()
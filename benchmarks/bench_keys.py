@@ -0,0 +1,39 @@
+"""Replay scripted key presses and report the throughput.
+
+Build the compiled core first to compare it with the pure-Python one:
+URWID_READLINE_COMPILE=1 pip install --no-build-isolation .
+
+Usage: python benchmarks/bench_keys.py [repeat]
+"""
+
+import sys
+import time
+
+from urwid_readline import ReadlineEdit, _core
+
+SCRIPT = (
+    list("the quick brown fox jumps over the lazy dog ")
+    + ["meta b", "meta b", "ctrl w", "ctrl y", "meta f", "ctrl e"]
+    + ["backspace"] * 4
+    + ["ctrl a", "meta d", "ctrl k", "ctrl y", "ctrl _"]
+)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    edit = ReadlineEdit(multiline=True)
+    size = edit.size
+    keypress = edit.keypress
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for key in SCRIPT:
+            keypress(size, key)
+    elapsed = time.perf_counter() - start
+    print(
+        "core: %s" % ("pure" if _core.__file__.endswith(".py") else "compiled")
+    )
+    print("%.0f keys/s" % (repeat * len(SCRIPT) / elapsed))
+
+
+if __name__ == "__main__":
+    main()
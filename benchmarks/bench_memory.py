@@ -0,0 +1,42 @@
+"""Report the memory held by idle ReadlineEdit widgets.
+
+Usage: python benchmarks/bench_memory.py [count]
+"""
+
+import gc
+import sys
+import tracemalloc
+
+import urwid
+
+from urwid_readline import ReadlineEdit
+
+
+def _bytes_per_widget(factory, count):
+    factory()  # warm up caches shared by all instances
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    widgets = [factory() for _ in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del widgets
+    return (after - before) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for label, factory in [
+        ("urwid.Edit", urwid.Edit),
+        ("ReadlineEdit", ReadlineEdit),
+        ("ReadlineEdit(multiline)", lambda: ReadlineEdit(multiline=True)),
+    ]:
+        print(
+            "%-24s %8.1f bytes/widget"
+            % (label + ":", _bytes_per_widget(factory, count))
+        )
+
+
+if __name__ == "__main__":
+    main()
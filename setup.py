@@ -1,5 +1,20 @@
+import os
+import sys
+
 from setuptools import find_packages, setup
 
+# Set URWID_READLINE_COMPILE=1 to compile the text primitives in
+# urwid_readline/_core.py with mypyc. Without mypyc, or without the
+# variable, the package is installed as pure Python.
+ext_modules = []
+if os.environ.get("URWID_READLINE_COMPILE"):
+    try:
+        from mypyc.build import mypycify
+    except ImportError:
+        print("mypyc is not installed, skipping compilation", file=sys.stderr)
+    else:
+        ext_modules = mypycify(["urwid_readline/_core.py"])
+
 setup(
     author="Marcin Kurczewski",
     author_email="rr-@sakuya.pl",
@@ -11,6 +26,7 @@ setup(
     url="https://github.com/rr-/urwid_readline",
     license="MIT",
     packages=find_packages(),
+    ext_modules=ext_modules,
     install_requires=["urwid"],
     classifiers=[
         "Environment :: Console",
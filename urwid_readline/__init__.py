@@ -1 +1,36 @@
-from .readline_edit import ReadlineEdit
+# Attributes are resolved lazily so that importing the package does not pull
+# in urwid until a widget is actually needed.
+_exports = {
+    "ReadlineEdit": ".readline_edit",
+    "PathCompleter": ".path_completer",
+    "ProcessPoolCompleter": ".process_completer",
+    "History": ".history",
+    "ReadlineEditPool": ".pool",
+    "CompletionCache": ".completion_cache",
+    "Document": ".document",
+    "CallableValidator": ".validators",
+    "CharsetValidator": ".validators",
+    "MaxLengthValidator": ".validators",
+    "RegexValidator": ".validators",
+    "Validator": ".validators",
+}
+
+__all__ = sorted(_exports)
+
+
+def __getattr__(name):
+    try:
+        module_name = _exports[name]
+    except KeyError:
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, name)
+        ) from None
+    import importlib
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,105 @@
+"""Text primitives behind the editing commands.
+
+This module is plain, fully annotated Python that mypyc can compile; see
+setup.py. When a compiled build is installed, Python imports it instead of
+this file, and the pure-Python version keeps working everywhere else.
+Keep it free of imports from the rest of the package.
+"""
+
+from typing import Mapping, Optional, Sequence, Tuple
+
+# (start, removed text, inserted text)
+Splice = Tuple[int, str, str]
+
+# Word classes of characters, see readline_edit._CharClasses.
+OTHER = 0
+WORD = 1
+MARK = 2
+
+_CHUNK_SIZE = 4096
+
+
+def splice(text: str, start: int, end: int, inserted: str) -> str:
+    return text[:start] + inserted + text[end:]
+
+
+def revert(text: str, splices: Sequence[Splice]) -> str:
+    """Undo ``splices``, which were applied to some text in order."""
+    for i in range(len(splices) - 1, -1, -1):
+        start, removed, inserted = splices[i]
+        text = text[:start] + removed + text[start + len(inserted) :]
+    return text
+
+
+def shift_position(
+    pos: int, change: Optional[Splice], text_length: int
+) -> int:
+    """Map a position in the text before a splice to the text after it."""
+    if change is None:
+        return min(pos, text_length)
+    start, removed, inserted = change
+    if pos >= start + len(removed):
+        return pos + len(inserted) - len(removed)
+    return min(pos, start)
+
+
+def line_start(text: str, pos: int) -> int:
+    return text.rfind("\n", 0, pos) + 1
+
+
+def line_end(text: str, pos: int) -> int:
+    end = text.find("\n", pos)
+    return len(text) if end == -1 else end
+
+
+def previous_word_start(
+    text: str, pos: int, classes: Mapping[str, int]
+) -> int:
+    while pos > 0 and classes[text[pos - 1]] != WORD:
+        pos -= 1
+    end = pos
+    while pos > 0 and classes[text[pos - 1]] != OTHER:
+        pos -= 1
+    # Marks at the start of the run belong to the separator before it.
+    while pos < end and classes[text[pos]] == MARK:
+        pos += 1
+    return pos
+
+
+def next_word_start(text: str, pos: int, classes: Mapping[str, int]) -> int:
+    end = len(text)
+    while pos < end and classes[text[pos]] != OTHER:
+        pos += 1
+    while pos < end and classes[text[pos]] != WORD:
+        pos += 1
+    return pos
+
+
+def diff_bounds(old: str, new: str) -> Tuple[int, int]:
+    """Return the lengths of the common prefix and suffix of two strings.
+
+    Compares chunk by chunk, so that the bulk of the work happens in C.
+    """
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit:
+        step = min(_CHUNK_SIZE, limit - prefix)
+        if old[prefix : prefix + step] != new[prefix : prefix + step]:
+            while old[prefix] == new[prefix]:
+                prefix += 1
+            break
+        prefix += step
+
+    limit -= prefix
+    suffix = 0
+    while suffix < limit:
+        step = min(_CHUNK_SIZE, limit - suffix)
+        if (
+            old[len(old) - suffix - step : len(old) - suffix]
+            != new[len(new) - suffix - step : len(new) - suffix]
+        ):
+            while old[len(old) - suffix - 1] == new[len(new) - suffix - 1]:
+                suffix += 1
+            break
+        suffix += step
+    return prefix, suffix
@@ -0,0 +1,72 @@
+import time
+from collections import OrderedDict
+
+
+class CompletionCache:
+    """LRU cache of completer results keyed by ``(completer, text)``.
+
+    Pass one to ReadlineEdit.enable_autocomplete to stop a new Tab session
+    from running the completer again for a word it has already completed.
+    A cache can be shared between widgets. At most ``max_size`` results
+    are kept, each for up to ``ttl`` seconds (None keeps them until they
+    are evicted or invalidated). Collection stops after
+    ``max_candidates`` candidates, which also ends completers that cycle
+    through their matches instead of returning None.
+    """
+
+    def __init__(self, max_size=256, ttl=30.0, max_candidates=1000):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_candidates = max_candidates
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def candidates(self, completer, text):
+        """Return the list of everything ``completer`` offers for
+        ``text``, calling it only on a cache miss."""
+        candidates = self._lookup((completer, text))
+        if candidates is None:
+            candidates = _collect(completer, text, self.max_candidates)
+            self.add(completer, text, candidates)
+        return candidates
+
+    def add(self, completer, text, candidates):
+        """Store the candidates ``completer`` offers for ``text``, e.g.
+        once they were ranked in the background."""
+        self._results[completer, text] = (time.monotonic(), candidates)
+        self._results.move_to_end((completer, text))
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def invalidate(self, completer=None):
+        """Drop the results of ``completer`` or of all completers."""
+        if completer is None:
+            self._results.clear()
+            return
+        for key in [key for key in self._results if key[0] == completer]:
+            del self._results[key]
+
+    def _lookup(self, key):
+        cached = self._results.get(key)
+        if cached is None:
+            return None
+        if self.ttl is not None and time.monotonic() - cached[0] > self.ttl:
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return cached[1]
+
+
+def _collect(completer, text, limit):
+    candidates = []
+    while len(candidates) < limit:
+        candidate = completer(text, len(candidates))
+        if not candidate:
+            break
+        candidates.append(candidate)
+    return candidates
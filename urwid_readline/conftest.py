@@ -0,0 +1,122 @@
+import itertools
+import os
+import select
+import time
+
+import pytest
+
+
+class FakeClock:
+    """Replacement for time.monotonic that only moves when told to."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMainLoop:
+    """The parts of urwid.MainLoop that the widgets use.
+
+    Alarms and watched pipes only run when the test asks for it. With a
+    clock, running an alarm first moves the clock to the time it is due.
+    The loop also acts as its own screen, recording stop and start calls.
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock
+        self.alarms = []
+        self.pipes = {}
+        self._order = itertools.count()
+        self.screen = self
+        self.screen_calls = []
+
+    def set_alarm_in(self, sec, callback, user_data=None):
+        alarm = (
+            time.monotonic() + sec,
+            next(self._order),
+            callback,
+            user_data,
+        )
+        self.alarms.append(alarm)
+        return alarm
+
+    def remove_alarm(self, alarm):
+        self.alarms.remove(alarm)
+
+    def run_alarms(self, until=None):
+        """Run the alarms due by ``until`` (all of them by default) in the
+        order they are due, including those they set themselves."""
+        while self.alarms:
+            alarm = min(self.alarms)
+            if until is not None and alarm[0] > until:
+                break
+            self.alarms.remove(alarm)
+            if self.clock is not None:
+                self.clock.now = max(self.clock.now, alarm[0])
+            alarm[2](self, alarm[3])
+        if until is not None and self.clock is not None:
+            self.clock.now = until
+
+    def watch_pipe(self, callback):
+        read_fd, write_fd = os.pipe()
+        self.pipes[write_fd] = (read_fd, callback)
+        return write_fd
+
+    def remove_watch_pipe(self, write_fd):
+        read_fd, _callback = self.pipes.pop(write_fd)
+        os.close(read_fd)
+        return True
+
+    def run_pipes(self, timeout=0):
+        """Call back the pipes written to within ``timeout`` seconds and
+        return the data read from them."""
+        fds = {read_fd: callback for read_fd, callback in self.pipes.values()}
+        ready, _, _ = select.select(list(fds), [], [], timeout)
+        received = []
+        for read_fd in ready:
+            data = os.read(read_fd, 1024)
+            received.append(data)
+            assert fds[read_fd](data)
+        return received
+
+    def stop(self):
+        self.screen_calls.append("stop")
+
+    def start(self):
+        self.screen_calls.append("start")
+
+
+class CountingCompleter:
+    """Completes ``words`` by prefix, recording every call."""
+
+    def __init__(self, words):
+        self.words = words
+        self.calls = []
+
+    def __call__(self, text, state):
+        self.calls.append((text, state))
+        matches = [word for word in self.words if word.startswith(text)]
+        return matches[state] if state < len(matches) else None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def loop(request):
+    # Only tests that ask for the fake clock run on it; worker processes
+    # and threads need the real one.
+    if "clock" in request.fixturenames:
+        return FakeMainLoop(request.getfixturevalue("clock"))
+    return FakeMainLoop()
+
+
+@pytest.fixture
+def make_completer():
+    return CountingCompleter
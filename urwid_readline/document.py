@@ -0,0 +1,29 @@
+import weakref
+
+
+class Document:
+    """Text, undo history and kill ring shared by several ReadlineEdit
+    views.
+
+    Pass the same document to several widgets (``ReadlineEdit(document=
+    doc)``) to show one buffer in multiple panes. Each view keeps its own
+    cursor, mark, caption and validators. An edit made through any view is
+    applied once; the other views take over the resulting string as is and
+    only shift their cursors by the delta. Views are held weakly, so a
+    discarded widget does not need to be detached.
+    """
+
+    # Shared widget state, see ReadlineEdit. Created lazily by whichever
+    # view needs it first.
+    _kill_ring = None
+    _undo_history = None
+    _undo_loader = None
+    _snapshot_text = None
+    _snapshot_kill = None
+
+    def __init__(self, text=""):
+        self.text = text
+        self.views = weakref.WeakSet()
+
+    def __len__(self):
+        return len(self.text)
@@ -0,0 +1,75 @@
+class _Node:
+    __slots__ = ("children", "latest")
+
+    def __init__(self):
+        self.children = {}
+        self.latest = None
+
+
+class History:
+    """Append-only list of previously entered lines with a prefix index.
+
+    Every prefix of every entry is stored in a trie whose nodes remember the
+    most recent entry passing through them, so looking up the newest entry
+    starting with a given prefix costs O(len(prefix)) regardless of the
+    history size. Lookups can continue from a previous result, so narrowing
+    the prefix by one typed character is O(1).
+    """
+
+    def __init__(self, entries=()):
+        self._entries = []
+        self._root = _Node()
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __getitem__(self, index):
+        return self._entries[index]
+
+    def append(self, entry):
+        if not entry:
+            return
+        index = len(self._entries)
+        self._entries.append(entry)
+        node = self._root
+        node.latest = index
+        for char in entry:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node()
+            node = child
+            node.latest = index
+
+    def lookup(self, prefix, cursor=None):
+        """Return a cursor for ``prefix``, optionally continuing from the
+        cursor returned for a shorter prefix of it.
+
+        A cursor is a ``(prefix, node)`` pair, where node is None if no entry
+        starts with the prefix.
+        """
+        if cursor is not None and prefix.startswith(cursor[0]):
+            depth, node = len(cursor[0]), cursor[1]
+        else:
+            depth, node = 0, self._root
+        for char in prefix[depth:] if node is not None else ():
+            node = node.children.get(char)
+            if node is None:
+                break
+        return prefix, node
+
+    def suggest(self, prefix, cursor=None):
+        """Return the remainder of the newest entry that starts with
+        ``prefix``, or None."""
+        return self.suggestion_for(self.lookup(prefix, cursor))
+
+    def suggestion_for(self, cursor):
+        prefix, node = cursor
+        if not prefix or node is None:
+            return None
+        entry = self._entries[node.latest]
+        return entry[len(prefix) :] or None
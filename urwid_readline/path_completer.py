@@ -0,0 +1,82 @@
+import bisect
+import os
+from collections import OrderedDict
+
+
+class PathCompleter:
+    """Filesystem path completer for ReadlineEdit.enable_autocomplete.
+
+    Directory listings are cached and reused until the directory's mtime
+    changes; at most ``max_dirs`` listings are kept, evicting the least
+    recently used one. Directories are completed with a trailing separator
+    so that the next Tab descends into them. Hidden entries are only
+    offered when the typed name starts with a dot or ``show_hidden`` is
+    set.
+    """
+
+    def __init__(self, max_dirs=128, show_hidden=False):
+        self.max_dirs = max_dirs
+        self.show_hidden = show_hidden
+        self._listings = OrderedDict()
+        self._last_text = None
+        self._last_candidates = ()
+
+    def __call__(self, text, state):
+        if text != self._last_text or state == 0:
+            self._last_candidates = self.candidates(text)
+            self._last_text = text
+        try:
+            return self._last_candidates[state]
+        except (IndexError, TypeError):
+            return None
+
+    def candidates(self, text):
+        head, sep, tail = text.rpartition(os.sep)
+        head += sep
+        names = self._listdir(os.path.expanduser(head) or os.curdir)
+        lo = bisect.bisect_left(names, tail)
+        hi = bisect.bisect_left(names, tail + "\U0010ffff", lo)
+        return [
+            head + name
+            for name in names[lo:hi]
+            if self.show_hidden or tail or not name.startswith(".")
+        ]
+
+    def invalidate(self, directory=None):
+        """Drop the cached listing of ``directory`` or of all directories."""
+        if directory is None:
+            self._listings.clear()
+        else:
+            self._listings.pop(directory, None)
+        self._last_text = None
+
+    def _listdir(self, directory):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return []
+        cached = self._listings.get(directory)
+        if cached is not None and cached[0] == mtime:
+            self._listings.move_to_end(directory)
+            return cached[1]
+
+        try:
+            with os.scandir(directory) as entries:
+                names = sorted(
+                    entry.name + os.sep if _is_dir(entry) else entry.name
+                    for entry in entries
+                )
+        except OSError:
+            return []
+        self._listings[directory] = (mtime, names)
+        self._listings.move_to_end(directory)
+        while len(self._listings) > self.max_dirs:
+            self._listings.popitem(last=False)
+        return names
+
+
+def _is_dir(entry):
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
@@ -0,0 +1,29 @@
+class ReadlineEditPool:
+    """Recycles ReadlineEdit widgets instead of constructing new ones.
+
+    Meant for virtualized views that create a widget per visible row or
+    cell: released widgets are kept (up to ``max_size``) and handed out
+    again by acquire after a ReadlineEdit.reset, which preserves their
+    configuration. ``factory`` builds a new widget when the pool is empty.
+    """
+
+    def __init__(self, factory=None, max_size=None):
+        if factory is None:
+            from .readline_edit import ReadlineEdit
+
+            factory = ReadlineEdit
+        self.factory = factory
+        self.max_size = max_size
+        self._free = []
+
+    def __len__(self):
+        return len(self._free)
+
+    def acquire(self, edit_text="", edit_pos=None, caption=None):
+        widget = self._free.pop() if self._free else self.factory()
+        widget.reset(edit_text, edit_pos, caption)
+        return widget
+
+    def release(self, widget):
+        if self.max_size is None or len(self._free) < self.max_size:
+            self._free.append(widget)
@@ -0,0 +1,162 @@
+import heapq
+import itertools
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# State of a worker process, set once by _load_shard.
+_shard = ()
+_scorer = None
+
+
+def fuzzy_score(query, candidate):
+    """Score ``candidate`` for containing the characters of ``query`` in
+    order, or return None if it does not.
+
+    Consecutive matches and matches at the start of a word (including
+    camelCase humps) score higher; among equal scores, shorter candidates
+    win. Lowercase queries match case-insensitively.
+    """
+    if query.islower():
+        candidate_key = candidate.lower()
+    else:
+        candidate_key = candidate
+    score = 0
+    start = 0
+    prev = -2
+    for char in query:
+        index = candidate_key.find(char, start)
+        if index == -1:
+            return None
+        if index == prev + 1:
+            score += 3
+        elif _is_word_start(candidate, index):
+            score += 2
+        else:
+            score += 1
+        prev = index
+        start = index + 1
+    return score, -len(candidate)
+
+
+def _is_word_start(text, index):
+    if index == 0:
+        return True
+    prev = text[index - 1]
+    return not prev.isalnum() or (prev.islower() and text[index].isupper())
+
+
+def _load_shard(shard, scorer):
+    global _shard, _scorer
+    _shard = shard
+    _scorer = scorer
+
+
+def _rank_shard(query, limit):
+    scorer = _scorer
+    ranked = []
+    for index, candidate in _shard:
+        score = scorer(query, candidate)
+        if score is not None:
+            ranked.append((score, -index, candidate))
+    return heapq.nlargest(limit, ranked)
+
+
+class ProcessPoolCompleter:
+    """Ranks a large candidate corpus in worker processes.
+
+    The corpus is split into ``shards`` parts once, each loaded into its
+    own single-process executor, so a query only ships the typed text to
+    the workers and the best ``limit`` candidates back. ``scorer`` is a
+    picklable ``func(query, candidate)`` returning a sortable score, or
+    None to drop the candidate; ties keep the corpus order.
+
+    Like PathCompleter, instances are ReadlineEdit completers; given a
+    main loop, the widget ranks through submit and keeps handling keys in
+    the meantime. Call close (or use the instance as a context manager) to
+    stop the workers.
+    """
+
+    def __init__(
+        self,
+        candidates,
+        scorer=fuzzy_score,
+        limit=50,
+        shards=None,
+        mp_context=None,
+    ):
+        candidates = list(candidates)
+        shards = max(1, min(shards or os.cpu_count() or 1, len(candidates)))
+        self.limit = limit
+        self._executors = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=mp_context,
+                initializer=_load_shard,
+                initargs=(
+                    [
+                        (index, candidates[index])
+                        for index in range(shard, len(candidates), shards)
+                    ],
+                    scorer,
+                ),
+            )
+            for shard in range(shards)
+        ]
+        self._last_text = None
+        self._last_candidates = ()
+
+    def __call__(self, text, state):
+        if text != self._last_text or state == 0:
+            self._last_candidates = self.candidates(text)
+            self._last_text = text
+        try:
+            return self._last_candidates[state]
+        except (IndexError, TypeError):
+            return None
+
+    def candidates(self, text):
+        return self.submit(text).result()
+
+    def submit(self, text):
+        """Start ranking the corpus for ``text`` and return a Future of
+        the best candidates, without waiting for the workers."""
+        futures = [
+            executor.submit(_rank_shard, text, self.limit)
+            for executor in self._executors
+        ]
+        result = Future()
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_shard_done(_future):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            if not result.set_running_or_notify_cancel():
+                return
+            try:
+                ranked = heapq.merge(
+                    *(future.result() for future in futures), reverse=True
+                )
+                result.set_result(
+                    [item[2] for item in itertools.islice(ranked, self.limit)]
+                )
+            except BaseException as exc:
+                result.set_exception(exc)
+
+        for future in futures:
+            future.add_done_callback(on_shard_done)
+        return result
+
+    def close(self):
+        for executor in self._executors:
+            executor.shutdown()
+        self._executors = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
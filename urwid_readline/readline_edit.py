@@ -1,8 +1,20 @@
 import contextlib
-import re
-import string
+import functools
+import os
+import threading
+import time
+import unicodedata
 
 import urwid
+from urwid.canvas import apply_text_layout
+
+from . import _core
+from ._core import MARK as _MARK
+from ._core import OTHER as _OTHER
+from ._core import WORD as _WORD
+from ._core import shift_position as _shift_position
+from .completion_cache import CompletionCache, _collect
+from .validators import CallableValidator, MaxLengthValidator, Validator
 
 
 def _is_valid_key(char):
@@ -11,31 +23,343 @@ def _is_valid_key(char):
     )
 
 
+def _motion(func):
+    """Mark a command as moving the cursor only, so that keypress can skip
+    undo capture for it."""
+    func.is_motion = True
+    return func
+
+
+def _prefix_argument(func):
+    """Mark a command as building the repeat count of the next command.
+
+    keypress calls it with the key that invoked it and keeps the count
+    pending instead of consuming it.
+    """
+    func.is_prefix_argument = True
+    return func
+
+
+def _repeatable(func):
+    """Mark a command as accepting a repeat count, which it applies in one
+    pass instead of being called that many times."""
+    func.repeatable = True
+    return func
+
+
+class _CharClasses(dict):
+    """Memoized per-character word class table.
+
+    Letters, digits and connector punctuation are word characters unless
+    an explicit set of ``word_chars`` is given. Combining marks and
+    zero-width joiners get their own class so that motions keep them with
+    the character they modify.
+    """
+
+    def __init__(self, word_chars=None):
+        super().__init__()
+        self.word_chars = word_chars
+
+    def __missing__(self, char):
+        category = unicodedata.category(char)
+        if category[0] == "M" or char == "\u200d":
+            cls = _MARK
+        elif self.word_chars is not None:
+            cls = _WORD if char in self.word_chars else _OTHER
+        elif category[0] in "LN" or category == "Pc":
+            cls = _WORD
+        else:
+            cls = _OTHER
+        self[char] = cls
+        return cls
+
+
+@functools.lru_cache(maxsize=None)
+def _char_class_table(word_chars):
+    # word_chars is None or a frozenset, so that it can be a cache key.
+    return _CharClasses(word_chars)
+
+
+def _is_escaped(text, pos, escape):
+    count = 0
+    while pos > 0 and text[pos - 1] == escape:
+        count += 1
+        pos -= 1
+    return count % 2 == 1
+
+
+def _find_completion_word(text, pos, delims, quotes="", escape=None):
+    """Return the offset at which the word ending at ``pos`` starts and the
+    quote character it is enclosed in, if any.
+
+    Only the text between the caret and the nearest delimiter is looked at;
+    with quoting enabled the scan is bounded by the start of the line.
+    """
+    start, quote, _anchor = _scan_completion_word(
+        text, pos, delims, quotes, escape
+    )
+    return start, quote
+
+
+def _scan_completion_word(text, pos, delims, quotes, escape, anchor=None):
+    """Like _find_completion_word, but also return an anchor: the scanner
+    state at the last word or quote boundary before ``pos``. Passing it to
+    the next call resumes the scan there instead of at the start of the
+    line, which stays valid as long as the text before it is unchanged."""
+    if not quotes:
+        start = pos
+        while start > 0:
+            if text[start - 1] in delims and not (
+                escape and _is_escaped(text, start - 1, escape)
+            ):
+                break
+            start -= 1
+        return start, None, None
+
+    line_start = text.rfind("\n", 0, pos) + 1
+    if anchor is not None and line_start <= anchor[0] <= pos:
+        i, start, quote, quote_start = anchor
+    else:
+        i = start = line_start
+        quote = quote_start = None
+        anchor = (i, start, quote, quote_start)
+    while i < pos:
+        char = text[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char == escape:
+            i += 1
+        elif char in quotes:
+            quote = char
+            quote_start = i + 1
+            anchor = (i + 1, start, quote, quote_start)
+        elif char in delims:
+            start = i + 1
+            anchor = (i + 1, start, quote, quote_start)
+        i += 1
+    if quote:
+        return quote_start, quote, anchor
+    return start, None, anchor
+
+
+def _unescape(text, escape):
+    if escape not in text:
+        return text
+    result = []
+    i = 0
+    while i < len(text):
+        if text[i] == escape and i + 1 < len(text):
+            i += 1
+        result.append(text[i])
+        i += 1
+    return "".join(result)
+
+
+def _escape(text, special, escape):
+    special = set(special + escape)
+    return "".join(escape + ch if ch in special else ch for ch in text)
+
+
+def _completer_reference(func):
+    if func is None:
+        return None
+    target = func if hasattr(func, "__qualname__") else type(func)
+    return "%s:%s" % (target.__module__, target.__qualname__)
+
+
+def _diff_splice(old, new):
+    """Return a splice turning ``old`` into ``new``."""
+    prefix, suffix = _core.diff_bounds(old, new)
+    return (
+        prefix,
+        old[prefix : len(old) - suffix],
+        new[prefix : len(new) - suffix],
+    )
+
+
+def _line_diff(old, new):
+    """Return the splices turning ``old`` into ``new`` line by line, in
+    ascending order and with offsets into ``old``.
+
+    The common prefix and suffix are skipped before difflib compares the
+    lines in between, so a small change in a large text stays cheap.
+    """
+    import difflib
+
+    prefix, suffix = _core.diff_bounds(old, new)
+    prefix = old.rfind("\n", 0, prefix) + 1
+    old_end = old.find("\n", len(old) - suffix) + 1 or len(old)
+    new_end = len(new) - (len(old) - old_end)
+    old_lines = old[prefix:old_end].splitlines(keepends=True)
+    new_lines = new[prefix:new_end].splitlines(keepends=True)
+
+    matcher = difflib.SequenceMatcher(
+        None, old_lines, new_lines, autojunk=False
+    )
+    splices = []
+    offset = prefix
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        removed = "".join(old_lines[i1:i2])
+        if tag != "equal":
+            splices.append((offset, removed, "".join(new_lines[j1:j2])))
+        offset += len(removed)
+    return splices
+
+
+def _capitalize(text):
+    # str.title would also start a new word after a digit ("1St").
+    chars = []
+    in_word = False
+    for char in text:
+        if char.isalnum():
+            chars.append(char.lower() if in_word else char.upper())
+            in_word = True
+        else:
+            chars.append(char)
+            in_word = False
+    return "".join(chars)
+
+
+def _join_lines(text):
+    lines = text.split("\n")
+    rest = [line.strip() for line in lines[1:]]
+    return " ".join([lines[0].rstrip()] + rest)
+
+
+class Keymap(dict):
+    """Maps keys to commands. A tuple of keys binds a chord, e.g.
+    ``keymap[("ctrl x", "ctrl u")] = edit.undo``.
+
+    Dispatch goes through a prefix trie that is rebuilt lazily whenever the
+    mapping changes. If a key is bound on its own and also starts a chord,
+    the single key wins.
+    """
+
+    __slots__ = ("_trie",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._trie = None
+
+    def __setitem__(self, key, command):
+        super().__setitem__(key, command)
+        self._trie = None
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._trie = None
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._trie = None
+
+    def setdefault(self, key, default=None):
+        self._trie = None
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self._trie = None
+        return super().pop(*args)
+
+    def popitem(self):
+        self._trie = None
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self._trie = None
+
+    @property
+    def trie(self):
+        if self._trie is None:
+            self._trie = self._build_trie()
+        return self._trie
+
+    def _build_trie(self):
+        root = {}
+        for keys, command in self.items():
+            if not isinstance(keys, tuple):
+                keys = (keys,)
+            node = root
+            for key in keys[:-1]:
+                child = node.get(key)
+                if child is None:
+                    child = node[key] = {}
+                elif not isinstance(child, dict):
+                    break
+                node = child
+            else:
+                node[keys[-1]] = command
+        return root
+
+
 class AutocompleteState:
-    def __init__(self, prefix, infix, suffix, cycle_forward):
-        self.prefix = prefix
+    __slots__ = (
+        "start",
+        "suffix_length",
+        "infix",
+        "raw_infix",
+        "quote",
+        "num",
+    )
+
+    def __init__(
+        self, start, suffix_length, infix, raw_infix, quote, cycle_forward
+    ):
+        self.start = start
+        self.suffix_length = suffix_length
         self.infix = infix
-        self.suffix = suffix
+        self.raw_infix = raw_infix
+        self.quote = quote
         self.num = 0 if cycle_forward else -1
 
 
+class _CompletionFetch:
+    """Candidates being collected in the background for ``text``, and the
+    Tab session waiting for them, if any."""
+
+    __slots__ = ("text", "future", "state")
+
+    def __init__(self, text, future, state):
+        self.text = text
+        self.future = future
+        self.state = state
+
+
 class PasteBuffer(list):
+    __slots__ = ()
+
     def append(self, text):
         if not len(text):
             return
         super().append(text)
 
 
-class UndoState:
-    def __init__(self, edit_pos, edit_text):
-        self.edit_pos = edit_pos
-        self.edit_text = edit_text
+class UndoStep:
+    """One undoable command: the splices it applied, in order, as
+    ``(start, removed, inserted)`` triples, and the cursor around it."""
+
+    __slots__ = ("splices", "old_pos", "new_pos")
+
+    def __init__(self, splices, old_pos, new_pos):
+        self.splices = splices
+        self.old_pos = old_pos
+        self.new_pos = new_pos
+
+    def revert(self, text):
+        return _core.revert(text, self.splices)
 
 
 class UndoBuffer:
+    __slots__ = ("pos", "buffer", "synced")
+
     def __init__(self):
         self.pos = 0
         self.buffer = []
+        # Number of leading entries that have not changed since the last
+        # state snapshot.
+        self.synced = 0
 
     @property
     def empty(self):
@@ -45,10 +369,10 @@ class UndoBuffer:
     def cur(self):
         return self.buffer[self.pos - 1]
 
-    def push(self, old_state, new_state):
-        self.buffer = self.buffer[: self.pos]
-        if old_state.edit_text != new_state.edit_text:
-            self.buffer.append((old_state, new_state))
+    def push(self, step):
+        del self.buffer[self.pos :]
+        self.synced = min(self.synced, self.pos)
+        self.buffer.append(step)
         self.pos = len(self.buffer)
 
     def pop(self):
@@ -56,36 +380,225 @@ class UndoBuffer:
             self.pos -= 1
 
 
+class _Shared:
+    """Widget attribute that lives on the widget's Document while it is
+    attached to one, so that all views of the document see one value."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, widget, owner=None):
+        if widget is None:
+            return self
+        document = widget._document
+        if document is not None:
+            return getattr(document, self.name)
+        return widget.__dict__.get(self.name)
+
+    def __set__(self, widget, value):
+        document = widget._document
+        if document is not None:
+            setattr(document, self.name, value)
+        else:
+            widget.__dict__[self.name] = value
+
+
+class _Debouncer:
+    """Calls ``callback`` once ``delay`` seconds have passed since the last
+    touch, or ``max_wait`` seconds after the first touch of a burst.
+
+    Only one main loop alarm is kept per burst: instead of being replaced
+    on every touch, it re-arms itself for the remainder when it fires too
+    early.
+    """
+
+    __slots__ = (
+        "loop",
+        "delay",
+        "max_wait",
+        "callback",
+        "_alarm",
+        "_first",
+        "_last",
+    )
+
+    def __init__(self, loop, delay, callback, max_wait=None):
+        self.loop = loop
+        self.delay = delay
+        self.max_wait = max_wait
+        self.callback = callback
+        self._alarm = None
+        self._first = self._last = 0.0
+
+    def touch(self):
+        self._last = time.monotonic()
+        if self._alarm is None:
+            self._first = self._last
+            self._alarm = self.loop.set_alarm_in(self.delay, self._on_alarm)
+
+    def cancel(self):
+        if self._alarm is not None:
+            self.loop.remove_alarm(self._alarm)
+            self._alarm = None
+
+    def _on_alarm(self, loop, _user_data=None):
+        now = time.monotonic()
+        remaining = self.delay - (now - self._last)
+        if self.max_wait is not None:
+            remaining = min(remaining, self.max_wait - (now - self._first))
+        if remaining > 0:
+            self._alarm = loop.set_alarm_in(remaining, self._on_alarm)
+            return
+        self._alarm = None
+        self.callback()
+
+
+_DEFAULT_CHUNK_SIZE = 64 * 1024
+_MAX_DIFF_SPLICES = 64
+
+
+def _iter_chunks(source, chunk_size):
+    if hasattr(source, "read"):
+        return iter(lambda: source.read(chunk_size), "")
+    return iter(source)
+
+
 class ReadlineEdit(urwid.Edit):
     ignore_focus = False
+    signals = urwid.Edit.signals + ["settled"]
+
+    # Per-widget bookkeeping defaults to these shared class attributes and
+    # only gets an instance copy once it is configured or used, so that idle
+    # widgets stay small.
+    size = (30,)  # SET MAXCOL DEFAULT VALUE
+    _char_classes = _char_class_table(None)
+    _validators = ()
+    _max_char = None
+    _autocomplete_state = None
+    _autocomplete_func = None
+    _autocomplete_key = None
+    _autocomplete_key_reverse = None
+    _autocomplete_delims = " \t\n;"
+    _autocomplete_quotes = ""
+    _autocomplete_escape = None
+    _autocomplete_cache = None
+    _completion_loop = None
+    _completion_fd = None
+    _completion_fetch = None
+    _completion_executor = None
+    # Quote scanner state at a position, see _scan_completion_word.
+    _completion_anchor = None
+    _prefetch = None
+    _settled = None
+    _keymap = None
+    _mark = None
+    indent_width = 4
+    _chord_node = None
+    _chord_time = 0.0
+    _repeat_count = None
+    # Seconds after which a half-typed chord or repeat count is dropped.
+    chord_timeout = 2.0
+    # Upper bound of a repeat count typed with digit_argument.
+    max_repeat_count = 1000
+    _revision = 0
+    _document = None
+    _kill_ring = _Shared()
+    _undo_history = _Shared()
+    _undo_journal = None
+    _undo_loader = _Shared()
+    _snapshot_text = _Shared()
+    _snapshot_kill = _Shared()
+    _pending_load = None
+    _injection_lock = None
+    _editor_loop = None
+    _editor_command = None
+    _history = None
+    _text_canvas = None
+    _invalidate_suppressed = False
+    _initializing = False
+    _input_future = None
+    _input_submit_key = None
+    # Key that submits read_input in multiline mode, where enter inserts a
+    # new line.
+    multiline_submit_key = "meta enter"
 
     def __init__(
         self,
         *args,
-        word_chars=string.ascii_letters + string.digits + "_",
+        word_chars=None,
         max_char=None,
+        validators=(),
+        document=None,
         **kwargs
     ):
-        if max_char and "edit_text" in kwargs:
+        if document is not None:
+            # The view shows the document's text as is: max_char and the
+            # validators only constrain edits made through this view.
+            if "edit_text" in kwargs or len(args) > 1:
+                raise ValueError("edit_text and document are exclusive")
+            kwargs["edit_text"] = document.text
+        elif max_char and "edit_text" in kwargs:
             kwargs["edit_text"] = kwargs["edit_text"][:max_char]
+        # urwid.Edit sets the initial text through set_edit_text, which
+        # must not become an undo step.
+        self._initializing = True
         super().__init__(*args, **kwargs)
-        self._word_regex1 = re.compile(
-            "([%s]+)" % "|".join(re.escape(ch) for ch in word_chars)
-        )
-        self._word_regex2 = re.compile(
-            "([^%s]+)" % "|".join(re.escape(ch) for ch in word_chars)
-        )
-        self._autocomplete_state = None
-        self._autocomplete_func = None
-        self._autocomplete_key = None
-        self._autocomplete_key_reverse = None
-        self._autocomplete_delims = " \t\n;"
-        self._max_char = max_char
-        self._paste_buffer = PasteBuffer()
-        self._undo_buffer = UndoBuffer()
-        self.size = (30,)  # SET MAXCOL DEFAULT VALUE
-
-        self.keymap = {
+        del self._initializing
+        if max_char:
+            self._max_char = max_char
+            self.add_validator(MaxLengthValidator(max_char))
+        for validator in validators:
+            self.add_validator(validator)
+        if word_chars is not None:
+            self._char_classes = _char_class_table(frozenset(word_chars))
+        if document is not None:
+            self.document = document
+
+    @property
+    def document(self):
+        """The Document this widget is a view of, or None."""
+        return self._document
+
+    @document.setter
+    def document(self, document):
+        """Attach the widget to ``document`` (taking over its text), or
+        detach it with None, leaving it a copy of the text with a fresh
+        undo history and kill ring."""
+        if self._document is not None:
+            self._document.views.discard(self)
+        for name in ("_kill_ring", "_undo_history", "_undo_loader"):
+            self.__dict__.pop(name, None)
+        self._document = document
+        if document is not None:
+            document.views.add(self)
+            self._set_text(document.text, None)
+
+    @property
+    def keymap(self):
+        if self._keymap is None:
+            self._keymap = self._default_keymap()
+        return self._keymap
+
+    @keymap.setter
+    def keymap(self, keymap):
+        self._keymap = Keymap(keymap)
+
+    @property
+    def _paste_buffer(self):
+        if self._kill_ring is None:
+            self._kill_ring = PasteBuffer()
+        return self._kill_ring
+
+    @property
+    def _undo_buffer(self):
+        if self._undo_history is None:
+            self._undo_history = UndoBuffer()
+            if self._undo_loader is not None:
+                self._load_undo_history()
+        return self._undo_history
+
+    def _default_keymap(self):
+        keymap = {
             "ctrl f": self.forward_char,
             "ctrl b": self.backward_char,
             "ctrl a": self.beginning_of_line,
@@ -110,17 +623,90 @@ class ReadlineEdit(urwid.Edit):
             "ctrl l": self.clear_screen,
             "ctrl y": self.paste,
             "ctrl _": self.undo,
+            ("ctrl x", "ctrl u"): self.undo,
+            "<0>": self.set_mark,
+            "ctrl @": self.set_mark,
+            ("ctrl x", "ctrl x"): self.exchange_point_and_mark,
+            "meta u": self.upcase_word,
+            "meta l": self.downcase_word,
+            "meta c": self.capitalize_word,
+            ("ctrl x", "ctrl l"): self.downcase_region,
+            ("ctrl x", "tab"): self.indent_region,
+            ("ctrl x", "shift tab"): self.dedent_region,
+            ("ctrl x", "ctrl e"): self.edit_externally,
         }
+        for digit in range(10):
+            keymap["meta %d" % digit] = self.digit_argument
 
         if self.multiline:
-            self.keymap.update(
+            keymap.update(
                 {
                     "enter": self.insert_new_line,
                 }
             )
+        return Keymap(keymap)
+
+    def reset(self, edit_text="", edit_pos=None, caption=None):
+        """Put the widget in the state of a freshly constructed one with
+        the given content, keeping its configuration (keymap, validators,
+        completer, autosuggest history, text injection).
+
+        The undo history, kill ring, completion state and cached canvases
+        are dropped. Signal handlers stay connected. A view of a Document
+        is detached from it first, so the other views keep the shared
+        state.
+        """
+        if self._document is not None:
+            self.document = None
+        self._pending_load = None
+        self._undo_history = None
+        self._undo_loader = None
+        self._snapshot_text = None
+        self._kill_ring = None
+        self._autocomplete_state = None
+        self._suggestion_cursor = None
+        self._suggestion_key = None
+        self._text_canvas = None
+        self._chord_node = None
+        self._repeat_count = None
+        self._mark = None
+        if self._input_future is not None:
+            self._input_future.cancel()
+            self._input_future = None
+        if self._injection_lock is not None:
+            with self._injection_lock:
+                self._injection_queue = []
+        if caption is not None:
+            self.set_caption(caption)
+        if self._max_char:
+            edit_text = edit_text[: self._max_char]
+        self.highlight = None
+        self._apply_text(edit_text, None)
+        self.set_edit_pos(len(edit_text) if edit_pos is None else edit_pos)
+
+    _navigation_keys = {
+        "right": "forward_char",
+        "left": "backward_char",
+        "up": "previous_line",
+        "ctrl p": "previous_line",
+        "down": "next_line",
+        "ctrl n": "next_line",
+    }
 
     def keypress(self, size, key):
         self.size = size
+        node = self._chord_node
+        if node is not None or self._repeat_count is not None:
+            if time.monotonic() - self._chord_time > self.chord_timeout:
+                node = self._chord_node = None
+                self._repeat_count = None
+        if node is not None:
+            return self._continue_chord(node, key)
+
+        if key == self._input_submit_key and self._input_future is not None:
+            self._submit_input()
+            return None
+
         if key == self._autocomplete_key and self._autocomplete_func:
             self._complete(True)
             return None
@@ -130,163 +716,357 @@ class ReadlineEdit(urwid.Edit):
         else:
             self._autocomplete_state = None
 
-        if key == "right":
-            return None if self.forward_char() else key
+        if (
+            self._history is not None
+            and key in self._suggestion_accept_keys
+            and self.accept_suggestion()
+        ):
+            return None
 
-        if key == "left":
-            return None if self.backward_char() else key
+        navigation = self._navigation_keys.get(key)
+        if navigation is not None:
+            moved = False
+            for _ in range(self._take_repeat_count()):
+                if not getattr(self, navigation)():
+                    break
+                moved = True
+            return None if moved else key
 
-        if key == "up" or key == "ctrl p":
-            return None if self.previous_line() else key
+        command = self.keymap.trie.get(key)
+        if isinstance(command, dict):
+            self._start_chord(command)
+            return None
+        if command is not None:
+            self._dispatch(command, key)
+            return None
+        if _is_valid_key(key):
+            with self._capture_undo():
+                self._insert_char_at_cursor(key * self._take_repeat_count())
+            return None
+        self._repeat_count = None
+        return key
 
-        if key == "down" or key == "ctrl n":
-            return None if self.next_line() else key
+    def _start_chord(self, node):
+        self._chord_node = node
+        self._chord_time = time.monotonic()
 
-        if key in self.keymap:
-            if self.keymap[key] == self.undo:
-                self.keymap[key]()
-            else:
-                with self._capture_undo():
-                    self.keymap[key]()
-            self._invalidate()
+    def _continue_chord(self, node, key):
+        command = node.get(key)
+        if isinstance(command, dict):
+            self._start_chord(command)
             return None
-        elif _is_valid_key(key):
+        self._chord_node = None
+        self._autocomplete_state = None
+        if command is None:
+            # The key does not complete a chord: drop the chord and let the
+            # parent widget handle the key.
+            self._repeat_count = None
+            return key
+        self._dispatch(command, key)
+        return None
+
+    def _take_repeat_count(self):
+        count = self._repeat_count
+        self._repeat_count = None
+        return 1 if count is None else count
+
+    @_prefix_argument
+    def digit_argument(self, key):
+        """Append the digit ending ``key`` (e.g. ``"meta 3"``) to the repeat
+        count of the next command, up to max_repeat_count."""
+        digit = int(key[-1])
+        count = (self._repeat_count or 0) * 10 + digit
+        self._repeat_count = min(count, self.max_repeat_count)
+        self._chord_time = time.monotonic()
+
+    def _dispatch(self, command, key):
+        if getattr(command, "is_prefix_argument", False):
+            command(key)
+        else:
+            self._run_command(command, self._take_repeat_count())
+
+    def _run_command(self, command, count=1):
+        repeatable = count != 1 and getattr(command, "repeatable", False)
+        if getattr(command, "is_motion", False) or command == self.undo:
+            if repeatable:
+                command(count)
+            else:
+                for _ in range(count):
+                    command()
+            return
+        with self._capture_undo():
+            if repeatable:
+                command(count)
+            else:
+                for _ in range(count):
+                    command()
+
+    def add_validator(self, validator):
+        """Register a constraint that every editing command must satisfy.
+
+        Accepts a Validator instance or a plain ``func(new_text) -> bool``.
+        """
+        if not isinstance(validator, Validator):
+            validator = CallableValidator(validator)
+        self._validators = [*self._validators, validator]
+        return validator
+
+    def remove_validator(self, validator):
+        validators = list(self._validators)
+        validators.remove(validator)
+        self._validators = validators
+
+    def _validate(self, start, end, text):
+        for validator in self._validators:
+            if validator.incremental:
+                text = validator.check(self._edit_text, start, end, text)
+                if text is None:
+                    return None
+            elif not validator.check_text(
+                _core.splice(self._edit_text, start, end, text)
+            ):
+                return None
+        return text
+
+    def _splice(self, start, end, text=""):
+        """Replace ``edit_text[start:end]`` with ``text``.
+
+        All editing commands go through here so that the validators see
+        each mutation exactly once. Returns the text that was actually
+        inserted (validators may shorten it) or None if the edit was
+        rejected.
+
+        A splice made outside of a command, e.g. by calling insert_text or
+        paste directly, is recorded as an undo step of its own.
+        """
+        if self._undo_journal is None:
             with self._capture_undo():
-                self._insert_char_at_cursor(key)
-            self._invalidate()
+                return self._splice(start, end, text)
+        text = self._validate(start, end, text)
+        if text is None:
             return None
-        return key
+        if start != end or text:
+            self._apply_text(
+                _core.splice(self._edit_text, start, end, text),
+                (start, self._edit_text[start:end], text),
+            )
+        return text
+
+    def insert_text(self, text):
+        text = self._normalize_to_caption(text)
+        if self.highlight:
+            start, end = self.highlight
+        else:
+            start = end = self._edit_pos
+        text = self._splice(start, end, text)
+        if text is not None:
+            self.set_edit_pos(start + len(text))
 
     def _insert_char_at_cursor(self, key):
-        if self._max_char and len(self.edit_text) == self._max_char:
+        text = self._splice(self._edit_pos, self._edit_pos, key)
+        if text:
+            self.set_edit_pos(self._edit_pos + len(text))
+
+    def clear_screen(self):
+        if self._splice(0, len(self._edit_text)) is not None:
+            self._pending_load = None
+            self.set_edit_pos(0)
+
+    def set_edit_text(self, text):
+        # The new text replaces whatever load_text is still appending to.
+        self._pending_load = None
+        # Text replaced from outside a command is an undo step of its own,
+        # so the steps recorded before it still revert cleanly.
+        if self._initializing:
+            self._apply_text(text, None)
             return
+        with self._capture_undo():
+            self._apply_text(text, None)
 
-        self.set_edit_text(
-            self._edit_text[0 : self._edit_pos]
-            + key
-            + self._edit_text[self._edit_pos :]
-        )
-        self.set_edit_pos(self._edit_pos + 1)
+    def _apply_text(self, text, splice):
+        old_text = self._edit_text
+        journal = self._undo_journal
+        if journal is not None:
+            if splice is None:
+                splice = _diff_splice(old_text, text)
+            journal.append(splice)
+        self._set_text(text, splice)
+        document = self._document
+        if document is not None:
+            document.text = text
+            if len(document.views) > 1:
+                if splice is None:
+                    splice = _diff_splice(old_text, text)
+                for view in document.views:
+                    if view is not self:
+                        view._follow_document(text, splice)
 
-    def clear_screen(self):
-        self.set_edit_pos(0)
-        self.set_edit_text("")
+    def _follow_document(self, text, splice):
+        # Another view changed the document: take over its string and map
+        # the cursor through the splice.
+        pos = _shift_position(self._edit_pos, splice, len(text))
+        self._set_text(text, splice)
+        self.set_edit_pos(pos)
+
+    def _set_text(self, text, splice):
+        if self._mark is not None:
+            self._mark = _shift_position(self._mark, splice, len(text))
+        anchor = self._completion_anchor
+        if anchor is not None and (splice is None or splice[0] < anchor[0]):
+            self._completion_anchor = None
+        self._revision += 1
+        super().set_edit_text(text)
+        if self._prefetch is not None:
+            self._prefetch.touch()
+        if self._settled is not None:
+            self._settled.touch()
 
-    def _make_undo_state(self):
-        return UndoState(self.edit_pos, self.edit_text)
+    def set_edit_pos(self, pos):
+        # Only a real cursor move needs a redraw; commands such as ctrl e at
+        # the end of the text end up here with the current position.
+        if min(max(pos, 0), len(self._edit_text)) == self._edit_pos:
+            self.highlight = None
+            self.pref_col_maxcol = None, None
+            return
+        super().set_edit_pos(pos)
 
-    def _apply_undo_state(self, state):
-        self.set_edit_text(state.edit_text)
-        self.set_edit_pos(state.edit_pos)
+    # urwid.Edit binds these properties to its own setters, which would
+    # bypass the overrides above.
+    edit_text = property(urwid.Edit.get_edit_text, set_edit_text)
+    edit_pos = property(lambda self: self._edit_pos, set_edit_pos)
+
+    def move_cursor_to_coords(self, size, x, y):
+        # urwid.Edit invalidates the widget even if the cursor stays put;
+        # only let that through when it actually moved.
+        pos = self._edit_pos
+        self._invalidate_suppressed = True
+        try:
+            moved = super().move_cursor_to_coords(size, x, y)
+        finally:
+            del self._invalidate_suppressed
+        if self._edit_pos != pos:
+            self._invalidate()
+        return moved
+
+    def _invalidate(self):
+        if not self._invalidate_suppressed:
+            super()._invalidate()
 
     @contextlib.contextmanager
     def _capture_undo(self):
-        old_state = self._make_undo_state()
-        yield
-        new_state = self._make_undo_state()
-        self._undo_buffer.push(old_state, new_state)
+        if self._undo_journal is not None:
+            # Nested capture: the outermost one records the whole command.
+            yield
+            return
+        old_pos = self._edit_pos
+        journal = self._undo_journal = []
+        try:
+            yield
+        finally:
+            self._undo_journal = None
+        # The journal holds the splices the command applied, so an unchanged
+        # text is detected without comparing old and new strings.
+        if journal:
+            self._undo_buffer.push(
+                UndoStep(tuple(journal), old_pos, self._edit_pos)
+            )
 
     def undo(self):
-        if self._undo_buffer.empty:
+        if self._undo_history is None and self._undo_loader is None:
+            return
+        undo_buffer = self._undo_buffer
+        if undo_buffer.empty:
             return
-        old_state, new_state = self._undo_buffer.cur
-        self._undo_buffer.pop()
-        self._apply_undo_state(old_state)
+        step = undo_buffer.cur
+        undo_buffer.pop()
+        self._apply_text(step.revert(self._edit_text), None)
+        self.set_edit_pos(step.old_pos)
 
     def paste(self):
         # do not paste if empty buffer
-        if not len(self._paste_buffer):
+        if not self._kill_ring:
             return
 
-        text = self._paste_buffer[-1]
-        if self._max_char:
-            chars_left = self._max_char - len(self.edit_text)
-            text = text[:chars_left]
-
-        self.set_edit_text(
-            self.edit_text[: self.edit_pos]
-            + text
-            + self.edit_text[self.edit_pos :]
-        )
-        self.set_edit_pos(self.edit_pos + len(text))
+        pos = self._edit_pos
+        text = self._splice(pos, pos, self._paste_buffer[-1])
+        if text:
+            self.set_edit_pos(pos + len(text))
 
+    @_motion
     def previous_line(self):
         x, y = self.get_cursor_coords(self.size)
         return self.move_cursor_to_coords(self.size, x, y - 1)
 
+    @_motion
     def next_line(self):
         x, y = self.get_cursor_coords(self.size)
         return self.move_cursor_to_coords(self.size, x, y + 1)
 
-    def backward_char(self):
+    @_motion
+    @_repeatable
+    def backward_char(self, count=1):
         if self._edit_pos > 0:
-            self.set_edit_pos(self._edit_pos - 1)
+            self.set_edit_pos(self._edit_pos - count)
             return True
         return False
 
-    def forward_char(self):
+    @_motion
+    @_repeatable
+    def forward_char(self, count=1):
         if self._edit_pos < len(self._edit_text):
-            self.set_edit_pos(self._edit_pos + 1)
+            self.set_edit_pos(self._edit_pos + count)
             return True
         return False
 
-    def backward_word(self):
-        for match in self._word_regex1.finditer(
-            self._edit_text[0 : self._edit_pos][::-1]
-        ):
-            self.set_edit_pos(self._edit_pos - match.end(1))
-            return
-        self.set_edit_pos(0)
+    def _previous_word_pos(self, pos):
+        return _core.previous_word_start(
+            self._edit_text, pos, self._char_classes
+        )
 
-    def forward_word(self):
-        for match in self._word_regex2.finditer(
-            self._edit_text[self._edit_pos :]
-        ):
-            self.set_edit_pos(self._edit_pos + match.end(1))
-            return
-        self.set_edit_pos(len(self._edit_text))
+    def _next_word_pos(self, pos):
+        return _core.next_word_start(self._edit_text, pos, self._char_classes)
 
-    def delete_char(self):
+    @_motion
+    @_repeatable
+    def backward_word(self, count=1):
+        pos = self._edit_pos
+        for _ in range(count):
+            pos = self._previous_word_pos(pos)
+        self.set_edit_pos(pos)
+
+    @_motion
+    @_repeatable
+    def forward_word(self, count=1):
+        pos = self._edit_pos
+        for _ in range(count):
+            pos = self._next_word_pos(pos)
+        self.set_edit_pos(pos)
+
+    @_repeatable
+    def delete_char(self, count=1):
         if self._edit_pos < len(self._edit_text):
-            self.set_edit_text(
-                self._edit_text[0 : self._edit_pos]
-                + self._edit_text[self._edit_pos + 1 :]
-            )
+            self._splice(self._edit_pos, self._edit_pos + count)
 
-    def backward_delete_char(self):
+    @_repeatable
+    def backward_delete_char(self, count=1):
         if self._edit_pos > 0:
-            self.set_edit_pos(self._edit_pos - 1)
-            self.set_edit_text(
-                self._edit_text[0 : self._edit_pos]
-                + self._edit_text[self._edit_pos + 1 :]
-            )
+            pos = max(self._edit_pos - count, 0)
+            if self._splice(pos, self._edit_pos) is not None:
+                self.set_edit_pos(pos)
+
+    def _kill(self, start, end):
+        killed = self._edit_text[start:end]
+        if self._splice(start, end) is not None:
+            self._paste_buffer.append(killed)
+            self.set_edit_pos(start)
 
     def backward_kill_line(self):
-        for pos in reversed(range(0, self.edit_pos)):
-            if self.edit_text[pos] == "\n":
-                self._paste_buffer.append(
-                    self.edit_text[pos + 1 : self.edit_pos]
-                )
-                self.set_edit_text(
-                    self._edit_text[: pos + 1]
-                    + self._edit_text[self.edit_pos :]
-                )
-                self.edit_pos = pos + 1
-                return
-        self._paste_buffer.append(self.edit_text[: self.edit_pos])
-        self.set_edit_text(self._edit_text[self.edit_pos :])
-        self.edit_pos = 0
+        pos = self._edit_pos
+        self._kill(_core.line_start(self._edit_text, pos), pos)
 
     def forward_kill_line(self):
-        for pos in range(self.edit_pos, len(self.edit_text)):
-            if self.edit_text[pos] == "\n":
-                self._paste_buffer.append(self.edit_text[self.edit_pos : pos])
-                self.set_edit_text(
-                    self._edit_text[: self.edit_pos] + self._edit_text[pos:]
-                )
-                return
-        self._paste_buffer.append(self.edit_text[self.edit_pos :])
-        self.set_edit_text(self._edit_text[: self.edit_pos])
+        pos = self._edit_pos
+        self._kill(pos, _core.line_end(self._edit_text, pos))
 
     def kill_whole_line(self):
         buffer_length = len(self._paste_buffer)
@@ -296,45 +1076,35 @@ class ReadlineEdit(urwid.Edit):
             # if text was added from both forward and backward kill
             self._paste_buffer[:2] = ["".join(self._paste_buffer[:2])]
 
-    def backward_kill_word(self):
-        pos = self._edit_pos
-        self.backward_word()
-        self._paste_buffer.append(self._edit_text[self.edit_pos : pos])
-        self.set_edit_text(
-            self._edit_text[: self._edit_pos] + self._edit_text[pos:]
-        )
+    @_repeatable
+    def backward_kill_word(self, count=1):
+        start = pos = self._edit_pos
+        for _ in range(count):
+            start = self._previous_word_pos(start)
+        self._kill(start, pos)
 
-    def kill_word(self):
-        pos = self._edit_pos
-        self.forward_word()
-        self._paste_buffer.append(self.edit_text[pos : self.edit_pos])
-        self.set_edit_text(
-            self._edit_text[0:pos] + self._edit_text[self._edit_pos :]
-        )
-        self.set_edit_pos(pos)
+    @_repeatable
+    def kill_word(self, count=1):
+        end = pos = self._edit_pos
+        for _ in range(count):
+            end = self._next_word_pos(end)
+        self._kill(pos, end)
 
+    @_motion
     def beginning_of_line(self):
         x, y = self.get_cursor_coords(self.size)
         if x == 0 and y > 0:
             y -= 1
         self.move_cursor_to_coords(self.size, 0, y)
 
+    @_motion
     def end_of_line(self):
-        text_length = len(self.edit_text)
-        # Move one character forward if at the end of a line.
-        if (
-            self.edit_pos < text_length
-            and self.edit_text[self.edit_pos] == "\n"
-        ):
-            self.forward_char()
-        # Set the position of cursor at the next '\n'.
-        for pos in range(self.edit_pos, text_length + 1):
-            if pos == text_length:
-                self.set_edit_pos(pos)
-                return
-            elif self.edit_text[pos] == "\n":
-                self.set_edit_pos(pos)
-                return
+        text = self._edit_text
+        pos = self._edit_pos
+        # Move on to the next line if already at the end of one.
+        if pos < len(text) and text[pos] == "\n":
+            pos += 1
+        self.set_edit_pos(_core.line_end(text, pos))
 
     def transpose_chars(self):
         x, y = self.get_cursor_coords(self.size)
@@ -344,75 +1114,916 @@ class ReadlineEdit(urwid.Edit):
         if x == 1:
             # Don't transpose in case of single character
             return
-        self.set_edit_text(
-            self._edit_text[0 : self._edit_pos - 2]
-            + self._edit_text[self._edit_pos - 1]
-            + self._edit_text[self._edit_pos - 2]
-            + self._edit_text[self._edit_pos :]
+        pos = self._edit_pos
+        self._splice(
+            pos - 2,
+            pos,
+            self._edit_text[pos - 1] + self._edit_text[pos - 2],
         )
 
     def insert_new_line(self):
         if self.multiline:
             self.insert_text("\n")
 
-    def enable_autocomplete(self, func, key="tab", key_reverse="shift tab"):
+    @property
+    def mark(self):
+        return self._mark
+
+    @property
+    def region(self):
+        """The ``(start, end)`` offsets between the mark and the cursor, or
+        None if no mark is set."""
+        if self._mark is None:
+            return None
+        return min(self._mark, self._edit_pos), max(self._mark, self._edit_pos)
+
+    @_motion
+    def set_mark(self, pos=None):
+        self._mark = self._edit_pos if pos is None else pos
+
+    def clear_mark(self):
+        self._mark = None
+
+    @_motion
+    def exchange_point_and_mark(self):
+        if self._mark is not None:
+            self._mark, pos = self._edit_pos, self._mark
+            self.set_edit_pos(pos)
+
+    def _transform(self, start, end, func):
+        """Replace ``edit_text[start:end]`` with ``func`` applied to it, as a
+        single splice and undo step. Returns the new text of the range or
+        None if the edit was rejected."""
+        old = self._edit_text[start:end]
+        new = func(old)
+        if new == old:
+            return old
+        with self._capture_undo():
+            return self._splice(start, end, new)
+
+    def _line_range(self):
+        start, end = self.region or (self._edit_pos, self._edit_pos)
+        text = self._edit_text
+        # A region ending at the very start of a line does not include it.
+        if end > start and text[end - 1] == "\n":
+            end -= 1
+        return _core.line_start(text, start), _core.line_end(text, end)
+
+    def _transform_words(self, count, func):
+        pos = self._edit_pos
+        end = pos
+        for _ in range(count):
+            end = self._next_word_pos(end)
+        # Include the word itself but not the separators after it.
+        classes = self._char_classes
+        while end > pos and classes[self._edit_text[end - 1]] == _OTHER:
+            end -= 1
+        new = self._transform(pos, end, func)
+        if new is not None:
+            self.set_edit_pos(pos + len(new))
+
+    @_repeatable
+    def upcase_word(self, count=1):
+        self._transform_words(count, str.upper)
+
+    @_repeatable
+    def downcase_word(self, count=1):
+        self._transform_words(count, str.lower)
+
+    @_repeatable
+    def capitalize_word(self, count=1):
+        self._transform_words(count, _capitalize)
+
+    def _transform_region(self, func):
+        if self.region is None:
+            return
+        start, end = self.region
+        pos = self._edit_pos
+        self._transform(start, end, func)
+        self.set_edit_pos(pos)
+
+    def upcase_region(self):
+        self._transform_region(str.upper)
+
+    def downcase_region(self):
+        self._transform_region(str.lower)
+
+    def _transform_lines(self, func):
+        start, end = self._line_range()
+        new = self._transform(start, end, func)
+        if new is not None:
+            self._mark = start
+            self.set_edit_pos(start + len(new))
+
+    @_repeatable
+    def indent_region(self, count=1):
+        """Indent the lines touched by the region, or the current line."""
+        indent = " " * self.indent_width * count
+        self._transform_lines(
+            lambda text: "\n".join(
+                indent + line if line else line for line in text.split("\n")
+            )
+        )
+
+    @_repeatable
+    def dedent_region(self, count=1):
+        width = self.indent_width * count
+
+        def dedent(line):
+            if line.startswith("\t"):
+                return line[1:]
+            stripped = line[:width].lstrip(" ")
+            return stripped + line[width:]
+
+        self._transform_lines(
+            lambda text: "\n".join(dedent(line) for line in text.split("\n"))
+        )
+
+    def sort_lines(self, reverse=False, key=None):
+        self._transform_lines(
+            lambda text: "\n".join(
+                sorted(text.split("\n"), reverse=reverse, key=key)
+            )
+        )
+
+    def join_lines(self):
+        """Join the lines touched by the region into one, separated by
+        single spaces. Without a region, joins the current line with the
+        next one."""
+        text = self._edit_text
+        start, end = self._line_range()
+        if text.find("\n", start, end) == -1:
+            if end == len(text):
+                return
+            end = text.find("\n", end + 1)
+            if end == -1:
+                end = len(text)
+        new = self._transform(start, end, _join_lines)
+        if new is not None:
+            self._mark = None
+            self.set_edit_pos(start + len(new))
+
+    def iter_text_chunks(self, chunk_size=_DEFAULT_CHUNK_SIZE):
+        """Yield edit_text in slices of at most ``chunk_size`` characters."""
+        text = self._edit_text
+        for start in range(0, len(text), chunk_size):
+            yield text[start : start + chunk_size]
+
+    def write_text(self, fileobj, chunk_size=_DEFAULT_CHUNK_SIZE):
+        """Write edit_text to a file object chunk by chunk."""
+        for chunk in self.iter_text_chunks(chunk_size):
+            fileobj.write(chunk)
+
+    def load_text(
+        self, source, chunk_size=_DEFAULT_CHUNK_SIZE, loop=None, on_done=None
+    ):
+        """Replace edit_text with the contents of a file object or an
+        iterable of string chunks.
+
+        Without ``loop`` the whole source is consumed right away. With an
+        urwid MainLoop the first chunk is shown immediately and the rest is
+        appended from alarms, doubling the batch size every time so that
+        the total amount of copying stays linear. ``on_done`` is called once
+        the source is exhausted.
+
+        Like set_edit_text, loading bypasses the validators; it also clears
+        the undo history and puts the cursor at the start of the text.
+        """
+        self._pending_load = None
+        self._undo_history = None
+        self._undo_loader = None
+        self._snapshot_text = None
+        self._autocomplete_state = None
+
+        if loop is None:
+            if hasattr(source, "read"):
+                text = source.read()
+            else:
+                text = "".join(source)
+            self._apply_text(text, None)
+            self.set_edit_pos(0)
+            if on_done:
+                on_done()
+            return
+
+        chunks = _iter_chunks(source, chunk_size)
+        self._apply_text(next(chunks, ""), None)
+        self.set_edit_pos(0)
+        token = self._pending_load = object()
+        batch_size = chunk_size
+
+        def load_more(loop, _user_data=None):
+            nonlocal batch_size
+            if self._pending_load is not token:
+                return
+            parts = []
+            size = 0
+            for chunk in chunks:
+                parts.append(chunk)
+                size += len(chunk)
+                if size >= batch_size:
+                    break
+            if parts:
+                text = "".join(parts)
+                self._apply_text(
+                    self._edit_text + text, (len(self._edit_text), "", text)
+                )
+            if size >= batch_size:
+                batch_size *= 2
+                loop.set_alarm_in(0, load_more)
+                return
+            self._pending_load = None
+            if on_done:
+                on_done()
+
+        loop.set_alarm_in(0, load_more)
+
+    def enable_external_editor(self, loop, editor=None):
+        """Let ctrl x ctrl e hand the text to an external editor.
+
+        ``editor`` is a command line; it defaults to $VISUAL, $EDITOR or
+        vi at the time the editor is started. The screen of ``loop`` is
+        stopped while the editor runs.
+        """
+        self._editor_loop = loop
+        self._editor_command = editor
+
+    def edit_externally(self):
+        """Edit the text in the external editor and apply the changes.
+
+        The result is applied as one splice per changed block of lines,
+        all in a single undo step, and the cursor follows the unchanged
+        text around it. Nothing changes if the editor exits with an error.
+        """
+        import shlex
+        import subprocess
+        import tempfile
+
+        loop = self._editor_loop
+        if loop is None:
+            return
+        editor = (
+            self._editor_command
+            or os.environ.get("VISUAL")
+            or os.environ.get("EDITOR")
+            or "vi"
+        )
+        old_text = self._edit_text
+        fd, path = tempfile.mkstemp(suffix=".txt", text=True)
+        try:
+            with open(fd, "w", encoding="utf-8", newline="") as handle:
+                self.write_text(handle)
+            if loop.screen is not None:
+                loop.screen.stop()
+            try:
+                status = subprocess.call(shlex.split(editor) + [path])
+            finally:
+                if loop.screen is not None:
+                    loop.screen.start()
+            if status != 0:
+                return
+            with open(path, encoding="utf-8", newline="") as handle:
+                new_text = handle.read()
+        finally:
+            os.unlink(path)
+        self._apply_line_diff(old_text, new_text)
+
+    def _apply_line_diff(self, old_text, new_text):
+        splices = _line_diff(old_text, new_text)
+        if len(splices) > _MAX_DIFF_SPLICES:
+            # Each splice copies the text once; past this many, replacing
+            # the span from the first to the last change is cheaper.
+            start = splices[0][0]
+            end = splices[-1][0] + len(splices[-1][1])
+            inserted = new_text[start : len(new_text) - len(old_text) + end]
+            splices = [(start, old_text[start:end], inserted)]
+        pos = self._edit_pos
+        with self._capture_undo():
+            # Going backwards keeps the offsets of earlier splices valid.
+            for start, removed, inserted in reversed(splices):
+                inserted = self._splice(start, start + len(removed), inserted)
+                if inserted is not None:
+                    pos = _shift_position(
+                        pos, (start, removed, inserted), len(self._edit_text)
+                    )
+        self.set_edit_pos(pos)
+
+    def export_state(self):
+        """Return a snapshot of the text, cursor, undo history, kill ring
+        and autocomplete configuration as a string.
+
+        See import_state for restoring it and export_state_update for
+        cheap incremental snapshots.
+        """
+        from . import state
+
+        undo_buffer = self._undo_buffer
+        header = {
+            "kind": "full",
+            "text": self._edit_text,
+            "pos": self._edit_pos,
+            "kill": list(self._kill_ring or ()),
+            "undo_pos": undo_buffer.pos,
+            "autocomplete": self._autocomplete_config(),
+        }
+        data = state.format_header() + state.format_record(
+            header, state.encode_steps(undo_buffer.buffer)
+        )
+        self._mark_snapshot()
+        return data
+
+    def export_state_update(self):
+        """Return a record describing what changed since the previous
+        export, to be appended to the previous snapshot.
+
+        The text is stored as a single splice and only new undo steps are
+        written, so autosaving a huge buffer after a few keystrokes stays
+        cheap. Falls back to a full snapshot if there is nothing to append
+        to.
+        """
+        if self._snapshot_text is None:
+            return self.export_state()
+        from . import state
+
+        header = {
+            "kind": "append",
+            "pos": self._edit_pos,
+            "autocomplete": self._autocomplete_config(),
+        }
+        old_text = self._snapshot_text
+        text = self._edit_text
+        if text is not old_text:
+            prefix, suffix = _core.diff_bounds(old_text, text)
+            header["splice"] = [
+                prefix,
+                len(old_text) - suffix,
+                text[prefix : len(text) - suffix],
+            ]
+        kill = tuple(self._kill_ring or ())
+        if kill != self._snapshot_kill:
+            header["kill"] = list(kill)
+        undo_line = "[]"
+        undo_buffer = self._undo_history
+        if undo_buffer is not None:
+            header["undo_base"] = undo_buffer.synced
+            header["undo_pos"] = undo_buffer.pos
+            undo_line = state.encode_steps(
+                undo_buffer.buffer[undo_buffer.synced :]
+            )
+        self._mark_snapshot()
+        return state.format_record(header, undo_line)
+
+    def import_state(self, data, completers=None):
+        """Restore a snapshot produced by export_state, followed by any
+        number of export_state_update records.
+
+        The undo history is decoded lazily on first use. The completer
+        itself cannot be serialized; it is looked up by its
+        ``module:qualname`` reference in the ``completers`` mapping, and the
+        current one is kept if it is not found there.
+        """
+        from . import state
+
+        text = None
+        kill = ()
+        undo_lines = []
+        undo_pos = 0
+        for header, undo_line in state.parse(data):
+            if header["kind"] == "full":
+                text = header["text"]
+                undo_lines = []
+            elif text is None:
+                raise ValueError("state snapshot does not start with text")
+            elif "splice" in header:
+                start, end, inserted = header["splice"]
+                text = text[:start] + inserted + text[end:]
+            kill = header.get("kill", kill)
+            if "undo_pos" in header:
+                undo_lines.append((header.get("undo_base", 0), undo_line))
+                undo_pos = header["undo_pos"]
+            pos = header["pos"]
+            autocomplete = header["autocomplete"]
+        if text is None:
+            raise ValueError("empty state snapshot")
+
+        self.reset(text, pos)
+        if kill:
+            self._kill_ring = PasteBuffer(kill)
+        self._undo_loader = (undo_lines, undo_pos)
+        self.set_completer_delims(autocomplete["delims"])
+        self.set_completer_quoting(
+            autocomplete["quotes"], autocomplete["escape"]
+        )
+        func = (completers or {}).get(autocomplete["func"])
+        if func is not None:
+            self.enable_autocomplete(
+                func, autocomplete["key"], autocomplete["key_reverse"]
+            )
+        self._snapshot_text = self._edit_text
+        self._snapshot_kill = tuple(self._kill_ring or ())
+
+    def _load_undo_history(self):
+        from . import state
+
+        undo_lines, undo_pos = self._undo_loader
+        self._undo_loader = None
+        buffer = self._undo_history.buffer
+        for base, raw in undo_lines:
+            del buffer[base:]
+            buffer.extend(
+                UndoStep(splices, old_pos, new_pos)
+                for old_pos, new_pos, splices in state.decode_steps(raw)
+            )
+        self._undo_history.pos = undo_pos
+        self._undo_history.synced = len(buffer)
+
+    def _mark_snapshot(self):
+        self._snapshot_text = self._edit_text
+        self._snapshot_kill = tuple(self._kill_ring or ())
+        if self._undo_history is not None:
+            self._undo_history.synced = len(self._undo_history.buffer)
+
+    def _autocomplete_config(self):
+        return {
+            "func": _completer_reference(self._autocomplete_func),
+            "key": self._autocomplete_key,
+            "key_reverse": self._autocomplete_key_reverse,
+            "delims": self._autocomplete_delims,
+            "quotes": self._autocomplete_quotes,
+            "escape": self._autocomplete_escape,
+        }
+
+    def enable_text_injection(self, loop=None):
+        """Allow other threads to feed text into this widget via
+        inject_text.
+
+        Must be called from the thread running the urwid main loop. With a
+        MainLoop, the queue is drained through a single watch_pipe wakeup
+        per batch; without one, call flush_injected_text yourself.
+        """
+        self.disable_text_injection()
+        self._injection_queue = []
+        self._injection_wakeup_pending = False
+        self._injection_loop = loop
+        self._injection_fd = (
+            loop.watch_pipe(self._on_injection_wakeup) if loop else None
+        )
+        self._injection_lock = threading.Lock()
+
+    def disable_text_injection(self):
+        lock = self._injection_lock
+        if lock is None:
+            return
+        # Under the lock, so that no inject_text call is left holding the
+        # file descriptor that is about to be closed.
+        with lock:
+            self._injection_lock = None
+            fd = self._injection_fd
+            self._injection_fd = None
+        if fd is not None:
+            self._injection_loop.remove_watch_pipe(fd)
+            os.close(fd)
+        self._injection_loop = None
+
+    def inject_text(self, text, append=False):
+        """Queue text for insertion at the cursor, or at the end of the text
+        if ``append`` is set. Safe to call from any thread."""
+        lock = self._injection_lock
+        if lock is None:
+            raise RuntimeError("text injection is not enabled")
+        with lock:
+            if self._injection_lock is not lock:
+                raise RuntimeError("text injection is not enabled")
+            self._injection_queue.append((append, text))
+            fd = self._injection_fd
+            if self._injection_wakeup_pending or fd is None:
+                return
+            self._injection_wakeup_pending = True
+            os.write(fd, b"\0")
+
+    def _on_injection_wakeup(self, _data):
+        self.flush_injected_text()
+        return True
+
+    def flush_injected_text(self):
+        """Apply all queued chunks as one edit with a single undo entry."""
+        lock = self._injection_lock
+        if lock is None:
+            return
+        with lock:
+            queue = self._injection_queue
+            self._injection_queue = []
+            self._injection_wakeup_pending = False
+        if not queue:
+            return
+        at_cursor = "".join(text for append, text in queue if not append)
+        at_end = "".join(text for append, text in queue if append)
+
+        # Redraw once for the whole batch rather than for every splice and
+        # cursor move.
+        revision = self._revision
+        pos = self._edit_pos
+        self._invalidate_suppressed = True
+        try:
+            with self._capture_undo():
+                follow = pos == len(self._edit_text)
+                if at_cursor:
+                    inserted = self._splice(pos, pos, at_cursor)
+                    if inserted:
+                        self.set_edit_pos(pos + len(inserted))
+                if at_end:
+                    end = len(self._edit_text)
+                    inserted = self._splice(end, end, at_end)
+                    if inserted and follow:
+                        self.set_edit_pos(end + len(inserted))
+        finally:
+            del self._invalidate_suppressed
+        if self._revision != revision or self._edit_pos != pos:
+            self._invalidate()
+
+    async def read_input(self, submit_key=None, timeout=None):
+        """Wait until the user submits the text and return it.
+
+        The text is submitted with ``submit_key``, which defaults to enter
+        in single-line mode and to multiline_submit_key in multiline mode.
+        Must be awaited on the asyncio loop driving the urwid main loop,
+        e.g. through urwid.AsyncioEventLoop. Raises asyncio.TimeoutError
+        after ``timeout`` seconds; after a timeout or cancellation the key
+        goes back to the regular key bindings. reset cancels a pending
+        read. The widget is otherwise left as it is, so call reset to start
+        the next prompt afresh.
+        """
+        import asyncio
+
+        if self._input_future is not None:
+            raise RuntimeError("read_input is already waiting for this edit")
+        if submit_key is None:
+            submit_key = (
+                self.multiline_submit_key if self.multiline else "enter"
+            )
+        future = asyncio.get_running_loop().create_future()
+        self._input_future = future
+        self._input_submit_key = submit_key
+        try:
+            if timeout is None:
+                return await future
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if self._input_future is future:
+                self._input_future = None
+                self._input_submit_key = None
+
+    def _submit_input(self):
+        future = self._input_future
+        self._input_future = None
+        self._input_submit_key = None
+        if not future.done():
+            future.set_result(self._edit_text)
+
+    def enable_autosuggest(
+        self, history, attr="autosuggest", accept_keys=("ctrl f", "end")
+    ):
+        """Show the newest matching History entry dimmed after the cursor.
+
+        The suggestion is only displayed while the cursor is at the end of
+        the text and the widget has focus; it is drawn with the ``attr``
+        display attribute and never becomes part of edit_text until it is
+        accepted with one of ``accept_keys``.
+        """
+        self._history = history
+        self._suggestion_attr = attr
+        self._suggestion_accept_keys = accept_keys
+        self._suggestion_cursor = None
+        self._suggestion_key = None
+        self._invalidate()
+
+    def disable_autosuggest(self):
+        self._history = None
+        self._invalidate()
+
+    @property
+    def suggestion(self):
+        """The text currently suggested after the cursor, or None."""
+        history = self._history
+        if (
+            history is None
+            or self._mask is not None
+            or self._edit_pos != len(self._edit_text)
+        ):
+            return None
+        key = (self._revision, len(history))
+        if key != self._suggestion_key:
+            cursor = self._suggestion_cursor
+            if self._suggestion_key and self._suggestion_key[1] != key[1]:
+                cursor = None
+            self._suggestion_cursor = history.lookup(self._edit_text, cursor)
+            self._suggestion_key = key
+        return history.suggestion_for(self._suggestion_cursor)
+
+    def accept_suggestion(self):
+        suggestion = self.suggestion
+        if not suggestion:
+            return False
+        with self._capture_undo():
+            end = len(self._edit_text)
+            suggestion = self._splice(end, end, suggestion)
+            if suggestion:
+                self.set_edit_pos(end + len(suggestion))
+        return True
+
+    def _get_text_with_suggestion(self, suggestion):
+        text, attrib = self.get_text()
+        attrib = list(attrib)
+        covered = sum(length for _attr, length in attrib)
+        if covered < len(text):
+            attrib.append((None, len(text) - covered))
+        attrib.append((self._suggestion_attr, len(suggestion)))
+        return text + suggestion, attrib
+
+    def rows(self, size, focus=False):
+        suggestion = self.suggestion if focus else None
+        if not suggestion:
+            return super().rows(size, focus)
+        (maxcol,) = size
+        text, _attrib = self._get_text_with_suggestion(suggestion)
+        return len(self.layout.layout(text, maxcol, self.align, self.wrap))
+
+    def render(self, size, focus=False):
+        suggestion = self.suggestion if focus else None
+        if not suggestion:
+            return self._render_text(size, focus)
+        (maxcol,) = size
+        text, attrib = self._get_text_with_suggestion(suggestion)
+        trans = self.layout.layout(text, maxcol, self.align, self.wrap)
+        canv = urwid.CompositeCanvas(
+            apply_text_layout(text, attrib, trans, maxcol)
+        )
+        x, y = urwid.text_layout.calc_coords(
+            text, trans, len(self._caption) + self._edit_pos
+        )
+        canv.cursor = min(x, maxcol - 1), y
+        return canv
+
+    def _render_text(self, size, focus):
+        # Same as urwid.Edit.render, except that the text canvas is kept
+        # around and reused while neither the text nor its layout changed,
+        # so that moving the cursor only updates the cursor position.
+        self._shift_view_to_cursor = bool(focus)
+        (maxcol,) = size
+        text, attrib = self.get_text()
+        trans = self.get_line_translation(maxcol, (text, attrib))
+        key = (self._revision, self._caption, self._mask, attrib, trans)
+        cache = self._text_canvas
+        if cache is None or cache[0] != key:
+            cache = self._text_canvas = (
+                key,
+                apply_text_layout(text, attrib, trans, maxcol),
+            )
+        canv = urwid.CompositeCanvas(cache[1])
+        if focus:
+            canv.cursor = self.get_cursor_coords(size)
+        return canv
+
+    def enable_autocomplete(
+        self, func, key="tab", key_reverse="shift tab", cache=None, loop=None
+    ):
+        """Complete the word before the cursor with ``func(text, state)``.
+
+        With a CompletionCache, the candidates for a word are collected
+        once and reused by later Tab sessions until they expire.
+
+        With a MainLoop ``loop``, the completer runs off the UI path: Tab
+        returns right away and the completion is applied once the
+        candidates arrive. Completers with a ``submit(text)`` method
+        returning a Future of the candidate list, like
+        ProcessPoolCompleter, rank in their own workers; others are called
+        in a background thread. The candidates are kept in ``cache``, or in
+        a private CompletionCache.
+        """
+        self._stop_completion_fetch()
+        if loop is None and self._prefetch is not None:
+            loop = self._prefetch.loop
+        if loop is not None:
+            if cache is None:
+                cache = CompletionCache()
+            self._watch_completions(loop)
         self._autocomplete_func = func
         self._autocomplete_key = key
         self._autocomplete_key_reverse = key_reverse
+        self._autocomplete_cache = cache
         self._autocomplete_state = None
 
+    def enable_settled_signal(self, loop, delay=0.3, max_wait=None):
+        """Emit ``settled`` with the current text once it has not changed
+        for ``delay`` seconds, instead of on every keystroke like
+        ``change``.
+
+        During uninterrupted typing, ``max_wait`` bounds how long listeners
+        go without an update. The last change is always delivered.
+        """
+        self.disable_settled_signal()
+        self._settled = _Debouncer(
+            loop, delay, self._emit_settled, max_wait=max_wait
+        )
+
+    def disable_settled_signal(self):
+        if self._settled is not None:
+            self._settled.cancel()
+            self._settled = None
+
+    def _emit_settled(self):
+        self._emit("settled", self._edit_text)
+
+    def enable_completion_prefetch(self, loop, delay=0.25):
+        """Warm the completion cache for the word at the cursor once typing
+        pauses for ``delay`` seconds, so that the next Tab is answered from
+        memory. Needs autocompletion enabled with a cache.
+
+        The completer runs off the UI path, as with
+        ``enable_autocomplete(..., loop=loop)``.
+        """
+        if self._autocomplete_cache is None:
+            raise RuntimeError("completion prefetch needs a completion cache")
+        self.disable_completion_prefetch()
+        if self._completion_loop is None:
+            self._watch_completions(loop)
+        self._prefetch = _Debouncer(loop, delay, self._prefetch_completions)
+
+    def disable_completion_prefetch(self):
+        if self._prefetch is not None:
+            self._prefetch.cancel()
+            self._prefetch = None
+
+    def _prefetch_completions(self):
+        func = self._autocomplete_func
+        cache = self._autocomplete_cache
+        if func is None or cache is None:
+            return
+        infix = self._completion_word()[3]
+        fetch = self._completion_fetch
+        if fetch is not None and fetch.text == infix:
+            return
+        if (func, infix) not in cache:
+            self._fetch_completions(infix)
+
+    def _completion_word(self):
+        """Return the start, quote character, raw text and unescaped text
+        of the word being completed."""
+        pos = self._edit_pos
+        start, quote, self._completion_anchor = _scan_completion_word(
+            self._edit_text,
+            pos,
+            self._autocomplete_delims,
+            self._autocomplete_quotes,
+            self._autocomplete_escape,
+            self._completion_anchor,
+        )
+        raw_infix = self._edit_text[start:pos]
+        if self._autocomplete_escape and not quote:
+            infix = _unescape(raw_infix, self._autocomplete_escape)
+        else:
+            infix = raw_infix
+        return start, quote, raw_infix, infix
+
     def set_completer_delims(self, delimiters):
         self._autocomplete_delims = delimiters
+        self._completion_anchor = None
 
-    def _complete(self, cycle_forward):
-        if self._autocomplete_state:
-            if self._autocomplete_state.num == 0 and not cycle_forward:
-                self._autocomplete_state.num = None
-            elif self._autocomplete_state.num == -1 and cycle_forward:
-                self._autocomplete_state.num = None
-            else:
-                self._autocomplete_state.num += 1 if cycle_forward else -1
-        else:
-            text_before_caret = self.edit_text[0 : self.edit_pos]
-            text_after_caret = self.edit_text[self.edit_pos :]
-
-            if self._autocomplete_delims:
-                group = re.escape(self._autocomplete_delims)
-                match = re.match(
-                    "^(?P<prefix>.*[" + group + "])(?P<infix>.*?)$",
-                    text_before_caret,
-                    flags=re.M | re.DOTALL,
-                )
-                if match:
-                    prefix = match.group("prefix")
-                    infix = match.group("infix")
-                else:
-                    prefix = ""
-                    infix = text_before_caret
-            else:
-                match = re.match(
-                    "^(?P<infix>.*?)$",
-                    text_before_caret,
-                    flags=re.M | re.DOTALL,
-                )
-                prefix = ""
-                if match:
-                    infix = match.group("infix")
-                else:
-                    infix = text_before_caret
+    def set_completer_quoting(self, quote_chars="\"'", escape_char="\\"):
+        """Enable shell-style quoting and escaping of completion words.
+
+        Inside an unclosed quote, delimiters do not end the word and the
+        completer sees the text after the opening quote. Outside of quotes,
+        ``escape_char`` escapes the next character: the completer is handed
+        the unescaped word and special characters in the chosen candidate
+        get escaped on insertion. Quotes do not span lines.
+        """
+        self._autocomplete_quotes = quote_chars or ""
+        self._autocomplete_escape = escape_char or None
+        self._completion_anchor = None
+
+    def _completion_match(self, infix, num):
+        cache = self._autocomplete_cache
+        if cache is None:
+            return self._autocomplete_func(infix, num)
+        try:
+            return cache.candidates(self._autocomplete_func, infix)[num]
+        except (IndexError, TypeError):
+            return None
+
+    def _fetch_pending(self, state):
+        """Make the Tab session ``state`` wait for candidates collected in
+        the background, if they are not cached yet."""
+        fetch = self._completion_fetch
+        if fetch is not None and fetch.text == state.infix:
+            fetch.state = state
+            return True
+        if (self._autocomplete_func, state.infix) in self._autocomplete_cache:
+            return False
+        self._fetch_completions(state.infix, state)
+        return True
 
-            suffix = text_after_caret
+    def _watch_completions(self, loop):
+        self._completion_loop = loop
+        self._completion_fd = loop.watch_pipe(self._on_completions_ready)
 
-            self._autocomplete_state = AutocompleteState(
-                prefix, infix, suffix, cycle_forward
+    def _fetch_completions(self, text, state=None):
+        fetch = self._completion_fetch
+        if fetch is not None:
+            fetch.future.cancel()
+        func = self._autocomplete_func
+        submit = getattr(func, "submit", None)
+        if submit is not None:
+            future = submit(text)
+        else:
+            # One thread per widget, so that the completer is never called
+            # concurrently.
+            if self._completion_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._completion_executor = ThreadPoolExecutor(max_workers=1)
+            future = self._completion_executor.submit(
+                _collect, func, text, self._autocomplete_cache.max_candidates
             )
+        self._completion_fetch = _CompletionFetch(text, future, state)
+        fd = self._completion_fd
+
+        def wake_up(_future):
+            # Runs in the thread that completed the future; the main loop
+            # picks up the result in _on_completions_ready.
+            try:
+                os.write(fd, b"\0")
+            except OSError:
+                pass
 
+        future.add_done_callback(wake_up)
+
+    def _on_completions_ready(self, _data):
+        fetch = self._completion_fetch
+        if fetch is None or not fetch.future.done():
+            return True
+        self._completion_fetch = None
+        if fetch.future.cancelled():
+            return True
+        self._autocomplete_cache.add(
+            self._autocomplete_func, fetch.text, fetch.future.result()
+        )
+        if fetch.state is not None and fetch.state is self._autocomplete_state:
+            self._apply_completion(fetch.state)
+        return True
+
+    def _stop_completion_fetch(self):
+        if self._completion_fetch is not None:
+            self._completion_fetch.future.cancel()
+            self._completion_fetch = None
+        if self._completion_fd is not None:
+            self._completion_loop.remove_watch_pipe(self._completion_fd)
+            os.close(self._completion_fd)
+            self._completion_fd = None
+            self._completion_loop = None
+        if self._completion_executor is not None:
+            self._completion_executor.shutdown(wait=False)
+            self._completion_executor = None
+
+    def _complete(self, cycle_forward):
         state = self._autocomplete_state
+        if state:
+            if state.num == 0 and not cycle_forward:
+                state.num = None
+            elif state.num == -1 and cycle_forward:
+                state.num = None
+            else:
+                state.num += 1 if cycle_forward else -1
+        else:
+            start, quote, raw_infix, infix = self._completion_word()
+            state = self._autocomplete_state = AutocompleteState(
+                start,
+                len(self._edit_text) - self._edit_pos,
+                infix,
+                raw_infix,
+                quote,
+                cycle_forward,
+            )
+        if self._completion_loop is not None and self._fetch_pending(state):
+            return
+        self._apply_completion(state)
 
-        match = self._autocomplete_func(state.infix, state.num)
-        if not match:
-            match = state.infix
+    def _apply_completion(self, state):
+        match = self._completion_match(state.infix, state.num)
+        if match:
+            if self._autocomplete_escape and not state.quote:
+                match = _escape(
+                    match,
+                    self._autocomplete_delims + self._autocomplete_quotes,
+                    self._autocomplete_escape,
+                )
+        else:
+            match = state.raw_infix
             self._autocomplete_state = None
 
-        self.edit_text = state.prefix + match + state.suffix
-        self.edit_pos = len(state.prefix) + len(match)
+        with self._capture_undo():
+            match = self._splice(
+                state.start, len(self._edit_text) - state.suffix_length, match
+            )
+            if match is not None:
+                self.edit_pos = state.start + len(match)
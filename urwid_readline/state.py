@@ -0,0 +1,61 @@
+"""Serialization of ReadlineEdit state snapshots.
+
+A snapshot is a versioned header line followed by records. Each record is
+two lines of JSON: a header with the text (or a splice against the
+previous record's text), the cursor, the kill ring and the autocomplete
+configuration, then the list of undo steps. Undo lines are kept as raw
+strings on import and only decoded when the undo history is first used.
+
+Records after the first are produced by append-style autosaves and only
+carry what changed since the previous record.
+"""
+
+import json
+
+MAGIC = "urwid_readline-state"
+VERSION = 1
+
+
+def encode(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_steps(steps):
+    return encode(
+        [
+            [step.old_pos, step.new_pos, [list(s) for s in step.splices]]
+            for step in steps
+        ]
+    )
+
+
+def decode_steps(raw):
+    return [
+        (old_pos, new_pos, tuple(tuple(s) for s in splices))
+        for old_pos, new_pos, splices in json.loads(raw)
+    ]
+
+
+def format_header():
+    return "%s %d\n" % (MAGIC, VERSION)
+
+
+def format_record(header, undo_line):
+    return encode(header) + "\n" + undo_line + "\n"
+
+
+def parse(data):
+    """Return a list of ``(header, raw undo line)`` pairs."""
+    lines = data.split("\n")
+    magic, _, version = lines[0].partition(" ")
+    if magic != MAGIC or not version.isdigit():
+        raise ValueError("not a urwid_readline state snapshot")
+    if int(version) > VERSION:
+        raise ValueError("unsupported state version %s" % version)
+    if lines[-1] == "":
+        lines.pop()
+    if len(lines) % 2 != 1:
+        raise ValueError("truncated state snapshot")
+    return [
+        (json.loads(lines[i]), lines[i + 1]) for i in range(1, len(lines), 2)
+    ]
@@ -0,0 +1,57 @@
+from urwid_readline import CompletionCache
+
+
+def test_results_are_reused(clock, make_completer):
+    complete = make_completer(["ab", "ac", "b"])
+    cache = CompletionCache()
+    assert cache.candidates(complete, "a") == ["ab", "ac"]
+    assert cache.candidates(complete, "a") == ["ab", "ac"]
+    assert complete.calls == [("a", 0), ("a", 1), ("a", 2)]
+    assert cache.candidates(complete, "x") == []
+    assert len(cache) == 2
+
+
+def test_ttl(clock, make_completer):
+    complete = make_completer(["ab"])
+    cache = CompletionCache(ttl=10)
+    cache.candidates(complete, "a")
+    clock.now = 10
+    assert (complete, "a") in cache
+    clock.now = 10.5
+    assert (complete, "a") not in cache
+    cache.candidates(complete, "a")
+    assert len(complete.calls) == 4
+
+
+def test_lru_eviction(clock, make_completer):
+    complete = make_completer(["ab"])
+    cache = CompletionCache(max_size=2)
+    cache.candidates(complete, "a")
+    cache.candidates(complete, "b")
+    cache.candidates(complete, "a")
+    cache.candidates(complete, "c")
+    assert (complete, "a") in cache
+    assert (complete, "b") not in cache
+    assert len(cache) == 2
+
+
+def test_invalidate(clock, make_completer):
+    first = make_completer(["ab"])
+    second = make_completer(["ab"])
+    cache = CompletionCache()
+    cache.candidates(first, "a")
+    cache.candidates(second, "a")
+    cache.invalidate(first)
+    assert (first, "a") not in cache
+    assert (second, "a") in cache
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_cycling_completer_is_capped(clock):
+    words = ["ab", "ac"]
+    cache = CompletionCache(max_candidates=5)
+    candidates = cache.candidates(
+        lambda text, state: words[state % len(words)], "a"
+    )
+    assert candidates == ["ab", "ac", "ab", "ac", "ab"]
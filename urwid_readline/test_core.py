@@ -0,0 +1,100 @@
+import importlib.util
+import os
+
+import pytest
+
+from urwid_readline import _core
+from urwid_readline.readline_edit import _char_class_table
+
+
+def _load_pure_core():
+    path = os.path.join(os.path.dirname(_core.__file__), "_core.py")
+    spec = importlib.util.spec_from_file_location("_pure_core", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Run against the pure-Python module and, when installed, the compiled one.
+IMPLEMENTATIONS = [_load_pure_core()]
+if not _core.__file__.endswith(".py"):
+    IMPLEMENTATIONS.append(_core)
+
+
+@pytest.fixture(params=IMPLEMENTATIONS, ids=lambda module: module.__file__)
+def core(request):
+    return request.param
+
+
+def test_splice_and_revert(core):
+    splices = [(0, "ab", "x"), (3, "", "yz"), (1, "cd", "")]
+    text = "abcdef"
+    for start, removed, inserted in splices:
+        assert text[start : start + len(removed)] == removed
+        text = core.splice(text, start, start + len(removed), inserted)
+    assert text == "xyzef"
+    assert core.revert(text, splices) == "abcdef"
+
+
+@pytest.mark.parametrize(
+    "pos, change, text_length, expected",
+    [
+        (5, None, 3, 3),
+        (1, None, 3, 1),
+        (5, (2, "ab", "xyz"), 0, 6),
+        (4, (2, "ab", "xyz"), 0, 5),
+        (3, (2, "ab", "xyz"), 0, 2),
+        (1, (2, "ab", "xyz"), 0, 1),
+    ],
+)
+def test_shift_position(core, pos, change, text_length, expected):
+    assert core.shift_position(pos, change, text_length) == expected
+
+
+@pytest.mark.parametrize(
+    "text, pos, start, end",
+    [
+        ("", 0, 0, 0),
+        ("abc", 1, 0, 3),
+        ("ab\ncd\nef", 4, 3, 5),
+        ("ab\ncd\nef", 3, 3, 5),
+        ("ab\ncd\nef", 2, 0, 2),
+    ],
+)
+def test_line_bounds(core, text, pos, start, end):
+    assert core.line_start(text, pos) == start
+    assert core.line_end(text, pos) == end
+
+
+@pytest.mark.parametrize(
+    "text, pos, previous, following",
+    [
+        ("foo bar", 5, 4, 7),
+        ("foo bar", 4, 0, 7),
+        ("  foo", 0, 0, 2),
+        ("żółw łódź", 6, 5, 9),
+        ("café noir", 5, 0, 6),
+    ],
+)
+def test_word_bounds(core, text, pos, previous, following):
+    classes = _char_class_table(None)
+    assert core.previous_word_start(text, pos, classes) == previous
+    assert core.next_word_start(text, pos, classes) == following
+
+
+@pytest.mark.parametrize(
+    "old, new, expected",
+    [
+        ("", "", (0, 0)),
+        ("abc", "abc", (3, 0)),
+        ("abc", "axc", (1, 1)),
+        ("abc", "abXc", (2, 1)),
+        ("abc", "c", (0, 1)),
+        ("aaaa", "aa", (2, 0)),
+        ("x" * 9000 + "a" + "y" * 9000, "x" * 9000 + "y" * 9000, (9000, 9000)),
+        ("a" * 10000 + "b", "a" * 10000 + "c", (10000, 0)),
+        ("x" + "a" * 10000, "y" + "a" * 10000, (0, 10000)),
+    ],
+)
+def test_diff_bounds(core, old, new, expected):
+    assert core.diff_bounds(old, new) == expected
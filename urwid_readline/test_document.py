@@ -0,0 +1,128 @@
+import gc
+
+import pytest
+
+from urwid_readline import Document, ReadlineEdit
+
+
+@pytest.fixture
+def views():
+    document = Document("hello world")
+    return (
+        ReadlineEdit(document=document, edit_pos=0),
+        ReadlineEdit(document=document, edit_pos=0),
+    )
+
+
+def test_views_share_the_string(views):
+    left, right = views
+    right.set_edit_pos(11)
+    left.keypress(left.size, ">")
+    assert left.edit_text == ">hello world"
+    assert right.edit_text is left.edit_text
+    assert left.document.text is left.edit_text
+    assert right.edit_pos == 12
+
+
+@pytest.mark.parametrize(
+    "right_pos, keys, expected_pos",
+    [
+        (0, ["ctrl e", "!"], 0),
+        (11, ["meta d"], 5),
+        (3, ["meta d"], 0),
+        (3, ["meta f", "ctrl k"], 3),
+        (8, ["meta f", "ctrl k"], 6),
+    ],
+)
+def test_cursors_follow_deltas(views, right_pos, keys, expected_pos):
+    left, right = views
+    right.set_edit_pos(right_pos)
+    for key in keys:
+        left.keypress(left.size, key)
+    assert right.edit_text == left.edit_text
+    assert right.edit_pos == expected_pos
+
+
+def test_shared_undo_and_kill_ring(views):
+    left, right = views
+    left.keypress(left.size, "meta d")
+    assert right.edit_text == "world"
+    right.keypress(right.size, "ctrl e")
+    right.keypress(right.size, "ctrl y")
+    assert left.edit_text == "worldhello "
+    left.keypress(left.size, "ctrl _")
+    assert right.edit_text == "world"
+    assert right.edit_pos == 5
+    right.keypress(right.size, "ctrl _")
+    assert left.edit_text == "hello world"
+    assert left.edit_pos == 11
+
+
+def test_whole_text_replacement_maps_cursors(views):
+    left, right = views
+    right.set_edit_pos(9)
+    left.set_edit_text("hi world")
+    assert right.edit_text == "hi world"
+    assert right.edit_pos == 6
+
+
+def test_validators_stay_per_view(views):
+    left, right = views
+    left.add_validator(lambda text: "x" not in text)
+    left.keypress(left.size, "x")
+    right.keypress(right.size, "x")
+    assert left.edit_text == "xhello world"
+
+
+def test_detach(views):
+    left, right = views
+    right.document = None
+    left.keypress(left.size, "a")
+    assert right.edit_text == "hello world"
+    assert right._kill_ring is None
+    right.keypress(right.size, "ctrl _")
+    assert right.edit_text == "hello world"
+
+    right.document = left.document
+    assert right.edit_text == "ahello world"
+
+
+@pytest.mark.parametrize("edit_pos, expected_pos", [(5, 5), (None, 11)])
+def test_edit_pos(edit_pos, expected_pos):
+    edit = ReadlineEdit(document=Document("hello world"), edit_pos=edit_pos)
+    assert edit.edit_pos == expected_pos
+
+
+@pytest.mark.parametrize(
+    "args, kwargs", [((), {"edit_text": "x"}), (("", "x"), {})]
+)
+def test_edit_text_conflicts_with_document(args, kwargs):
+    with pytest.raises(ValueError):
+        ReadlineEdit(*args, document=Document("hello world"), **kwargs)
+
+
+def test_max_char_applies_to_edits_only():
+    document = Document("hello world")
+    edit = ReadlineEdit(document=document, max_char=5)
+    assert edit.edit_text == "hello world"
+    edit.keypress(edit.size, "!")
+    assert document.text == "hello world"
+
+
+def test_reset_detaches_view(views):
+    left, right = views
+    left.keypress(left.size, "meta d")
+    right.reset("new")
+    assert right.document is None
+    assert right.edit_text == "new"
+    assert left.edit_text == "world"
+    assert left._paste_buffer == ["hello "]
+    left.keypress(left.size, "ctrl _")
+    assert left.edit_text == "hello world"
+
+
+def test_views_are_weak():
+    document = Document()
+    ReadlineEdit(document=document)
+    gc.collect()
+    assert len(document.views) == 0
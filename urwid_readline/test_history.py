@@ -0,0 +1,38 @@
+import pytest
+
+from urwid_readline import History
+
+
+@pytest.mark.parametrize(
+    "prefix, expected",
+    [
+        ("", None),
+        ("g", "it status"),
+        ("git c", "ommit -m wip"),
+        ("git commit -m wip", None),
+        ("ls", " -la"),
+        ("x", None),
+    ],
+)
+def test_suggest(prefix, expected):
+    history = History(
+        ["git commit -m wip", "ls -la", "git checkout main", "git status"]
+    )
+    history.append("git commit -m wip")
+    history.append("git status")
+    assert history.suggest(prefix) == expected
+
+
+def test_lookup_continues_from_cursor():
+    history = History(["make test", "make install"])
+    cursor = history.lookup("m")
+    cursor = history.lookup("mak", cursor)
+    assert history.suggestion_for(cursor) == "e install"
+    cursor = history.lookup("make t", cursor)
+    assert history.suggestion_for(cursor) == "est"
+    cursor = history.lookup("make tx", cursor)
+    assert history.suggestion_for(cursor) is None
+    cursor = history.lookup("make txy", cursor)
+    assert history.suggestion_for(cursor) is None
+    cursor = history.lookup("make i", cursor)
+    assert history.suggestion_for(cursor) == "nstall"
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from urwid_readline import PathCompleter, ReadlineEdit
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / "alpha").mkdir()
+    (tmp_path / "alpha" / "inner.txt").write_text("")
+    (tmp_path / "almond.txt").write_text("")
+    (tmp_path / "beta.txt").write_text("")
+    (tmp_path / ".hidden").write_text("")
+    return str(tmp_path) + os.sep
+
+
+@pytest.mark.parametrize(
+    "typed, expected",
+    [
+        ("al", ["almond.txt", "alpha" + os.sep]),
+        ("", ["almond.txt", "alpha" + os.sep, "beta.txt"]),
+        (".", [".hidden"]),
+        ("alpha" + os.sep, ["alpha" + os.sep + "inner.txt"]),
+        ("missing" + os.sep, []),
+        ("x", []),
+    ],
+)
+def test_candidates(tree, typed, expected):
+    completer = PathCompleter()
+    assert completer.candidates(tree + typed) == [
+        tree + name for name in expected
+    ]
+
+
+def test_listing_is_cached_until_mtime_changes(tree, monkeypatch):
+    calls = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        calls.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", counting_scandir)
+    completer = PathCompleter()
+    completer.candidates(tree + "a")
+    completer.candidates(tree + "b")
+    assert len(calls) == 1
+
+    os.utime(tree, ns=(0, 0))
+    assert completer.candidates(tree + "b") == [tree + "beta.txt"]
+    assert len(calls) == 2
+
+
+def test_lru_bound(tree):
+    completer = PathCompleter(max_dirs=1)
+    completer.candidates(tree)
+    completer.candidates(tree + "alpha" + os.sep)
+    assert list(completer._listings) == [tree + "alpha" + os.sep]
+
+
+def test_enable_autocomplete(tree):
+    edit = ReadlineEdit(edit_text="cat " + tree + "al")
+    edit.enable_autocomplete(PathCompleter())
+    edit.keypress(edit.size, "tab")
+    assert edit.edit_text == "cat " + tree + "almond.txt"
+    edit.keypress(edit.size, "tab")
+    assert edit.edit_text == "cat " + tree + "alpha" + os.sep
+    edit.keypress(edit.size, "ctrl e")
+    edit.keypress(edit.size, "tab")
+    assert edit.edit_text == "cat " + tree + "alpha" + os.sep + "inner.txt"
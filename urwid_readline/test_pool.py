@@ -0,0 +1,45 @@
+from urwid_readline import ReadlineEdit, ReadlineEditPool
+
+
+def test_reset_keeps_configuration():
+    def compl(text, state):
+        return None
+
+    edit = ReadlineEdit(edit_text="abcdef", max_char=4, multiline=True)
+    edit.enable_autocomplete(compl)
+    keymap = edit.keymap
+    edit.keypress(edit.size, "ctrl u")
+    edit.keypress(edit.size, "x")
+    edit.reset("123456", edit_pos=1, caption="> ")
+    assert edit.edit_text == "1234"
+    assert edit.edit_pos == 1
+    assert edit.caption == "> "
+    assert edit.keymap is keymap
+    assert edit._autocomplete_func is compl
+    assert edit._undo_history is None
+    edit.undo()
+    assert edit.edit_text == "1234"
+    edit.paste()
+    assert edit.edit_text == "1234"
+
+
+def test_pool_recycles_widgets():
+    created = []
+
+    def factory():
+        widget = ReadlineEdit()
+        created.append(widget)
+        return widget
+
+    pool = ReadlineEditPool(factory, max_size=1)
+    first = pool.acquire("row 1")
+    second = pool.acquire("row 2")
+    first.keypress(first.size, "x")
+    pool.release(first)
+    pool.release(second)
+    assert len(pool) == 1
+    third = pool.acquire("row 3", edit_pos=0)
+    assert third is first
+    assert third.edit_text == "row 3"
+    assert third.edit_pos == 0
+    assert len(created) == 2
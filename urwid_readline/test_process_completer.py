@@ -0,0 +1,71 @@
+import pytest
+
+from urwid_readline import ProcessPoolCompleter, ReadlineEdit
+from urwid_readline.process_completer import fuzzy_score
+
+CORPUS = [
+    "get_value",
+    "set_value",
+    "getattr",
+    "value_getter",
+    "GetValue",
+    "reset",
+]
+
+
+@pytest.fixture(scope="module")
+def completer():
+    with ProcessPoolCompleter(CORPUS, limit=4, shards=3) as completer:
+        yield completer
+
+
+@pytest.mark.parametrize(
+    "query, candidate, expected",
+    [
+        ("gv", "get_value", (4, -9)),
+        ("get", "get_value", (8, -9)),
+        ("gv", "GetValue", (4, -8)),
+        ("Gv", "get_value", None),
+        ("xyz", "get_value", None),
+        ("", "abc", (0, -3)),
+    ],
+)
+def test_fuzzy_score(query, candidate, expected):
+    assert fuzzy_score(query, candidate) == expected
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("get", ["getattr", "GetValue", "get_value", "value_getter"]),
+        ("gv", ["GetValue", "get_value"]),
+        ("res", ["reset"]),
+        ("", ["reset", "getattr", "GetValue", "get_value"]),
+        ("qq", []),
+    ],
+)
+def test_candidates(completer, query, expected):
+    assert completer.candidates(query) == expected
+
+
+def test_submit(completer):
+    future = completer.submit("gv")
+    assert future.result(timeout=30) == ["GetValue", "get_value"]
+
+
+def test_completes_in_edit(completer):
+    edit = ReadlineEdit(edit_text="x gv", edit_pos=4)
+    edit.enable_autocomplete(completer)
+    edit.keypress(edit.size, "tab")
+    assert edit.edit_text == "x GetValue"
+    edit.keypress(edit.size, "tab")
+    assert edit.edit_text == "x get_value"
+    edit.keypress(edit.size, "shift tab")
+    assert edit.edit_text == "x GetValue"
+
+
+def test_single_shard_for_small_corpus():
+    with ProcessPoolCompleter(["a"], shards=8) as completer:
+        assert len(completer._executors) == 1
+        assert completer("a", 0) == "a"
+        assert completer("a", 1) is None
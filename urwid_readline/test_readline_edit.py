@@ -1,6 +1,29 @@
-import pytest
+import asyncio
+import concurrent.futures
+import io
+import os
+import shlex
+import subprocess
+import sys
+import threading
 
-from urwid_readline import ReadlineEdit
+import pytest
+import urwid
+
+from urwid_readline import (
+    CharsetValidator,
+    CompletionCache,
+    History,
+    ProcessPoolCompleter,
+    ReadlineEdit,
+    RegexValidator,
+    Validator,
+)
+from urwid_readline.readline_edit import (
+    _find_completion_word,
+    _line_diff,
+    _scan_completion_word,
+)
 
 
 @pytest.mark.parametrize("set_pos, end_pos", [(100, 3), (-1, 0)])
@@ -136,6 +159,36 @@ def test_forward_word(start_text, start_pos, end_pos):
     assert edit.edit_pos == end_pos
 
 
+@pytest.mark.parametrize(
+    "start_text, start_pos, word_chars, forward_pos, backward_pos",
+    [
+        ("żółw łódź", 0, None, 5, 0),
+        ("żółw łódź", 9, None, 9, 5),
+        ("Привет мир", 2, None, 7, 0),
+        ("日本語 テキスト", 1, None, 4, 0),
+        ("cafe\u0301 noir", 0, None, 6, 0),
+        ("cafe\u0301 noir", 10, None, 10, 6),
+        ("a|b", 0, None, 2, 0),
+        ("a|b", 3, None, 3, 2),
+        ("a-b a", 0, "ab-", 4, 0),
+        ("a-b a", 0, list("ab-"), 4, 0),
+        ("a-b a", 0, {"a", "b"}, 2, 0),
+        ("żółw łódź", 0, "abc", 9, 0),
+    ],
+)
+def test_unicode_word_motion(
+    start_text, start_pos, word_chars, forward_pos, backward_pos
+):
+    edit = ReadlineEdit(
+        edit_text=start_text, edit_pos=start_pos, word_chars=word_chars
+    )
+    edit.forward_word()
+    assert edit.edit_pos == forward_pos
+    edit.set_edit_pos(start_pos)
+    edit.backward_word()
+    assert edit.edit_pos == backward_pos
+
+
 @pytest.mark.parametrize(
     "start_text, start_pos, end_text, end_pos",
     [
@@ -681,6 +734,70 @@ def test_undo(keys, expected_edit_pos, expected_text):
     assert edit.text == expected_text
 
 
+@pytest.mark.parametrize(
+    "typed, new_text, typed_after, expected",
+    [
+        ("abc", "hello world", "", ["abc", "ab", "a", ""]),
+        ("hello", "", "ab", ["a", "", "hello", "hell"]),
+        ("", "x", "", ["", ""]),
+    ],
+)
+def test_undo_text_set_outside_command(typed, new_text, typed_after, expected):
+    edit = ReadlineEdit()
+    for key in typed:
+        edit.keypress(edit.size, key)
+    edit.set_edit_text(new_text)
+    for key in typed_after:
+        edit.keypress(edit.size, key)
+    texts = []
+    for _ in expected:
+        edit.keypress(edit.size, "ctrl _")
+        texts.append(edit.edit_text)
+    assert texts == expected
+
+
+def test_undo_completion():
+    edit = ReadlineEdit()
+    edit.enable_autocomplete(lambda text, state: ["alpha", "almond"][state])
+    texts = []
+    for key in ["a", "l", "tab", "tab", "ctrl _", "ctrl _", "ctrl _"]:
+        edit.keypress(edit.size, key)
+        texts.append(edit.edit_text)
+    assert texts == ["a", "al", "alpha", "almond", "alpha", "al", "a"]
+
+
+@pytest.mark.parametrize(
+    "call, expected",
+    [
+        (lambda edit: edit.insert_text("XYZ"), "XYZab"),
+        (lambda edit: edit.paste(), "Qab"),
+        (lambda edit: edit.delete_char(), "b"),
+        (lambda edit: edit.forward_kill_line(), ""),
+        (lambda edit: edit.clear_screen(), ""),
+    ],
+)
+def test_undo_direct_method_call(call, expected):
+    edit = ReadlineEdit()
+    edit._paste_buffer.append("Q")
+    for key in "ab":
+        edit.keypress(edit.size, key)
+    edit.set_edit_pos(0)
+    call(edit)
+    assert edit.edit_text == expected
+    texts = []
+    for _ in range(3):
+        edit.keypress(edit.size, "ctrl _")
+        texts.append(edit.edit_text)
+    assert texts == ["ab", "a", ""]
+
+
+def test_initial_text_is_not_an_undo_step():
+    edit = ReadlineEdit(edit_text="foo")
+    edit.keypress(edit.size, "ctrl _")
+    assert edit.edit_text == "foo"
+    assert "_undo_history" not in vars(edit)
+
+
 @pytest.mark.parametrize(
     "paste_buffer, text, max_char, pos, expected_pos, expected_text",
     [
@@ -715,3 +832,883 @@ def test_insert_char_at_cursor(
     edit._insert_char_at_cursor(key)
     assert edit.edit_pos == expected_pos
     assert edit.edit_text == expected_text
+
+
+@pytest.mark.parametrize(
+    "text, pos, keys, max_char, expected_text",
+    [
+        ("ab", 2, ["enter"], 2, "ab"),
+        ("ab", 2, ["enter"], 3, "ab\n"),
+        ("ab", 2, ["ctrl t"], 2, "ba"),
+        ("ab", 2, ["backspace", "c", "d"], 2, "ac"),
+    ],
+)
+def test_max_char_multiline(text, pos, keys, max_char, expected_text):
+    edit = ReadlineEdit(
+        edit_text=text, edit_pos=pos, max_char=max_char, multiline=True
+    )
+    for key in keys:
+        edit.keypress(edit.size, key)
+    assert edit.edit_text == expected_text
+
+
+@pytest.mark.parametrize(
+    "validator, keys, expected_text",
+    [
+        (CharsetValidator("0123456789"), ["1", "a", "2"], "12"),
+        (RegexValidator(r"-?\d*"), ["-", "1", "-", "x"], "-1"),
+        (lambda text: text.count("a") < 2, ["a", "b", "a"], "ab"),
+    ],
+)
+def test_validators(validator, keys, expected_text):
+    edit = ReadlineEdit(validators=[validator])
+    for key in keys:
+        edit.keypress(edit.size, key)
+    assert edit.edit_text == expected_text
+
+
+def test_validator_sees_only_delta():
+    calls = []
+
+    class RecordingValidator(Validator):
+        def check(self, edit_text, start, end, text):
+            calls.append((start, end, text))
+            return text
+
+    edit = ReadlineEdit(edit_text="abc", edit_pos=1)
+    edit.add_validator(RecordingValidator())
+    edit.keypress(edit.size, "x")
+    edit.keypress(edit.size, "ctrl k")
+    assert calls == [(1, 1, "x"), (2, 4, "")]
+    assert edit.edit_text == "ax"
+
+
+def test_package_import_is_lazy():
+    code = (
+        "import sys, urwid_readline; "
+        "assert 'urwid' not in sys.modules; "
+        "urwid_readline.ReadlineEdit; "
+        "assert 'urwid' in sys.modules"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=root)
+
+
+def test_idle_widget_allocates_no_bookkeeping():
+    edit = ReadlineEdit(edit_text="asd")
+    assert not {"_keymap", "_kill_ring", "_undo_history"} & set(vars(edit))
+    edit.keypress(edit.size, "ctrl a")
+    assert "_keymap" in vars(edit)
+    assert "_kill_ring" not in vars(edit)
+    edit.keypress(edit.size, "ctrl k")
+    assert edit._paste_buffer == ["asd"]
+
+
+def test_keymap_is_per_instance():
+    edit1 = ReadlineEdit()
+    edit2 = ReadlineEdit(multiline=True)
+    edit1.keymap["ctrl x"] = edit1.clear_screen
+    assert "ctrl x" not in edit2.keymap
+    assert "enter" in edit2.keymap
+    assert "enter" not in edit1.keymap
+
+
+@pytest.mark.parametrize(
+    "key", ["ctrl a", "ctrl e", "meta f", "meta b", "home", "end"]
+)
+def test_motions_skip_undo_capture(key):
+    edit = ReadlineEdit(edit_text="foo bar", edit_pos=3)
+    edit.keypress(edit.size, key)
+    assert "_undo_history" not in vars(edit)
+
+
+@pytest.mark.parametrize("key", ["delete", "ctrl d", "ctrl k", "ctrl y"])
+def test_noop_mutation_records_no_undo(key):
+    edit = ReadlineEdit(edit_text="foo", edit_pos=3)
+    edit.keypress(edit.size, "x")
+    edit.keypress(edit.size, key)
+    assert edit._undo_buffer.pos == 1
+    edit.undo()
+    assert edit.edit_text == "foo"
+
+
+@pytest.mark.parametrize("use_file", [True, False])
+def test_load_text(use_file):
+    text = "".join("line %d\n" % i for i in range(1000))
+    source = io.StringIO(text) if use_file else [text[:10], text[10:]]
+    edit = ReadlineEdit(edit_text="old")
+    edit.keypress(edit.size, "x")
+    edit.load_text(source)
+    assert edit.edit_text == text
+    assert edit.edit_pos == 0
+    edit.undo()
+    assert edit.edit_text == text
+
+
+def test_load_text_progressively(loop):
+    text = "".join("line %d\n" % i for i in range(1000))
+    done = []
+    edit = ReadlineEdit(multiline=True)
+    edit.load_text(
+        io.StringIO(text),
+        chunk_size=100,
+        loop=loop,
+        on_done=lambda: done.append(True),
+    )
+    assert edit.edit_text == text[:100]
+    assert not done
+    loop.run_alarms()
+    assert edit.edit_text == text
+    assert done == [True]
+
+
+@pytest.mark.parametrize(
+    "replace",
+    [
+        lambda edit: edit.set_edit_text("new text"),
+        lambda edit: edit.keypress(edit.size, "ctrl l"),
+        lambda edit: edit.import_state(
+            ReadlineEdit(edit_text="new text").export_state()
+        ),
+    ],
+)
+def test_replacing_text_cancels_load(loop, replace):
+    edit = ReadlineEdit()
+    edit.load_text(["A" * 10] + ["B"] * 30, chunk_size=10, loop=loop)
+    replace(edit)
+    text = edit.edit_text
+    loop.run_alarms()
+    assert edit.edit_text == text
+
+
+def test_write_text():
+    text = "".join("line %d\n" % i for i in range(1000))
+    edit = ReadlineEdit(edit_text=text, multiline=True)
+    assert list(edit.iter_text_chunks(5000)) == [text[:5000], text[5000:]]
+    output = io.StringIO()
+    edit.write_text(output, chunk_size=100)
+    assert output.getvalue() == text
+
+
+def test_inject_text_from_threads():
+    edit = ReadlineEdit(edit_text="[]", edit_pos=1)
+    edit.enable_text_injection()
+    workers = [
+        threading.Thread(target=edit.inject_text, args=("ab",))
+        for _ in range(10)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    edit.inject_text("!", append=True)
+    assert edit.edit_text == "[]"
+    edit.flush_injected_text()
+    assert edit.edit_text == "[" + "ab" * 10 + "]!"
+    assert edit.edit_pos == 21
+    edit.undo()
+    assert edit.edit_text == "[]"
+    assert edit.edit_pos == 1
+
+
+def test_inject_text_wakes_up_loop_once(loop):
+    edit = ReadlineEdit(multiline=True)
+    edit.enable_text_injection(loop)
+    for i in range(3):
+        edit.inject_text("line %d\n" % i, append=True)
+    assert loop.run_pipes() == [b"\0"]
+    assert edit.edit_text == "line 0\nline 1\nline 2\n"
+    assert edit.edit_pos == len(edit.edit_text)
+    edit.disable_text_injection()
+    assert loop.pipes == {}
+    with pytest.raises(RuntimeError):
+        edit.inject_text("x")
+
+
+@pytest.mark.parametrize(
+    "text, quotes, escape, expected",
+    [
+        ("ls fo", "", None, (3, None)),
+        ("ls my\\ fo", "", None, (7, None)),
+        ("ls my\\ fo", "", "\\", (3, None)),
+        ("ls my\\\\ fo", "", "\\", (8, None)),
+        ('ls "my fo', '"', None, (4, '"')),
+        ('ls "my" fo', '"', None, (8, None)),
+        ("ls 'a b' \"c d", "'\"", "\\", (10, '"')),
+        ('ls "x\nmy fo', '"', None, (9, None)),
+    ],
+)
+def test_find_completion_word(text, quotes, escape, expected):
+    assert (
+        _find_completion_word(text, len(text), " \t\n;", quotes, escape)
+        == expected
+    )
+
+
+def test_completion_word_anchor():
+    text = 'ls "a b" c\\ d;\'e "f\'\nx "y z'
+    anchor = None
+    for pos in range(len(text) + 1):
+        start, quote, anchor = _scan_completion_word(
+            text, pos, " \t\n;", "'\"", "\\", anchor
+        )
+        assert (start, quote) == _find_completion_word(
+            text, pos, " \t\n;", "'\"", "\\"
+        )
+
+
+def test_completion_anchor_follows_edits():
+    edit = ReadlineEdit(edit_text='cat "my f', edit_pos=9)
+    edit.set_completer_quoting()
+    edit.enable_autocomplete(
+        lambda text, state: "my file" if not state else None
+    )
+    edit.keypress(edit.size, "tab")
+    assert edit.edit_text == 'cat "my file'
+    assert edit._completion_anchor[:3] == (5, 4, '"')
+    edit.keypress(edit.size, "x")
+    edit.keypress(edit.size, "tab")
+    assert edit._completion_anchor[:3] == (5, 4, '"')
+    edit.set_edit_pos(0)
+    edit.keypress(edit.size, "y")
+    assert edit._completion_anchor is None
+
+
+@pytest.mark.parametrize(
+    "start_text, expected_text, expected_infix",
+    [
+        ('cat "my f', 'cat "my file.txt', "my f"),
+        ("cat my\\ f", "cat my\\ file.txt", "my f"),
+        ("cat m", "cat my\\ file.txt", "m"),
+    ],
+)
+def test_autocomplete_quoting(start_text, expected_text, expected_infix):
+    seen = []
+
+    def compl(text, state):
+        seen.append(text)
+        return "my file.txt" if state == 0 else None
+
+    edit = ReadlineEdit(edit_text=start_text + "; x")
+    edit.edit_pos = len(start_text)
+    edit.enable_autocomplete(compl)
+    edit.set_completer_quoting()
+    edit.keypress(edit.size, "tab")
+    assert seen == [expected_infix]
+    assert edit.edit_text == expected_text + "; x"
+    assert edit.edit_pos == len(expected_text)
+    edit.keypress(edit.size, "tab")
+    assert edit.edit_text == start_text + "; x"
+
+
+@pytest.mark.parametrize("accept_key", ["ctrl f", "end"])
+def test_autosuggest(accept_key):
+    history = History(["git status", "git commit"])
+    edit = ReadlineEdit()
+    edit.enable_autosuggest(history)
+    for key in "git s":
+        edit.keypress(edit.size, key)
+    assert edit.suggestion == "tatus"
+    assert edit.edit_text == "git s"
+    canvas = edit.render((20,), focus=True)
+    assert canvas.text == [b"git status          "]
+    assert canvas.cursor == (5, 0)
+    assert edit.render((20,)).text == [b"git s               "]
+
+    edit.keypress(edit.size, "left")
+    assert edit.suggestion is None
+    edit.keypress(edit.size, "right")
+    edit.keypress(edit.size, accept_key)
+    assert edit.edit_text == "git status"
+    assert edit.edit_pos == 10
+    assert edit.suggestion is None
+    edit.undo()
+    assert edit.edit_text == "git s"
+
+
+def test_autosuggest_sees_new_history_entries():
+    history = History()
+    edit = ReadlineEdit(edit_text="ma")
+    edit.enable_autosuggest(history)
+    assert edit.suggestion is None
+    history.append("make")
+    assert edit.suggestion == "ke"
+
+
+@pytest.mark.parametrize(
+    "text, pos, key, invalidated",
+    [
+        ("abc", 3, "ctrl f", False),
+        ("abc", 3, "delete", False),
+        ("abc", 3, "ctrl _", False),
+        ("abc", 3, "ctrl y", False),
+        ("abc", 3, "ctrl e", False),
+        ("abc", 0, "ctrl a", False),
+        ("abc", 0, "ctrl f", True),
+        ("abc", 3, "x", True),
+        ("abc", 1, "down", False),
+        ("ab\ncd", 1, "down", True),
+    ],
+)
+def test_invalidate_only_on_change(monkeypatch, text, pos, key, invalidated):
+    calls = []
+    edit = ReadlineEdit(edit_text=text, edit_pos=pos, multiline=True)
+    monkeypatch.setattr(
+        urwid.Edit, "_invalidate", lambda self: calls.append(True)
+    )
+    edit.keypress(edit.size, key)
+    assert bool(calls) == invalidated
+
+
+@pytest.mark.parametrize(
+    "queue, invalidations",
+    [([("ab", False), ("cd", True)], 1), ([("", False)], 0)],
+)
+def test_flush_injected_text_invalidates_once(
+    monkeypatch, queue, invalidations
+):
+    calls = []
+    edit = ReadlineEdit(edit_text="xy", edit_pos=2)
+    edit.enable_text_injection()
+    for text, append in queue:
+        edit.inject_text(text, append=append)
+    monkeypatch.setattr(
+        urwid.Edit, "_invalidate", lambda self: calls.append(True)
+    )
+    edit.flush_injected_text()
+    assert len(calls) == invalidations
+
+
+def test_render_reuses_text_canvas_for_cursor_moves():
+    edit = ReadlineEdit(edit_text="hello world")
+    first = edit.render((20,), focus=True)
+    text_canvas = edit._text_canvas[1]
+    edit.keypress((20,), "ctrl a")
+    second = edit.render((20,), focus=True)
+    assert edit._text_canvas[1] is text_canvas
+    assert first.cursor == (11, 0)
+    assert second.cursor == (0, 0)
+    assert second.text == [b"hello world         "]
+    edit.keypress((20,), "x")
+    third = edit.render((20,), focus=True)
+    assert edit._text_canvas[1] is not text_canvas
+    assert third.text == [b"xhello world        "]
+
+
+def test_render_follows_mask():
+    edit = ReadlineEdit(edit_text="secret")
+    assert edit.render((10,)).text == [b"secret    "]
+    edit.set_mask("*")
+    assert edit.render((10,)).text == [b"******    "]
+    edit.set_mask(None)
+    assert edit.render((10,)).text == [b"secret    "]
+
+
+def test_property_setters_use_overrides():
+    edit = ReadlineEdit(edit_text="abc")
+    revision = edit._revision
+    edit.edit_text = "abcd"
+    assert edit._revision == revision + 1
+    edit.edit_pos = 100
+    assert edit.edit_pos == 4
+
+
+@pytest.mark.parametrize(
+    "keys, expected_text, expected_pos",
+    [
+        (["meta 3", "ctrl d"], "defgh", 0),
+        (["meta 1", "meta 2", "ctrl d"], "", 0),
+        (["ctrl e", "meta 3", "backspace"], "abcde", 5),
+        (["meta 3", "x"], "xxxabcdefgh", 3),
+        (["meta 2", "ctrl f"], "abcdefgh", 2),
+        (["meta 2", "right"], "abcdefgh", 2),
+        (["meta 1", "meta 0", "meta 0", "meta 0", "meta 0", "x"], None, 1000),
+    ],
+)
+def test_repeat_count(keys, expected_text, expected_pos):
+    edit = ReadlineEdit(edit_text="abcdefgh", edit_pos=0)
+    for key in keys:
+        assert edit.keypress(edit.size, key) is None
+    if expected_text is None:
+        expected_text = "x" * edit.max_repeat_count + "abcdefgh"
+    assert edit.edit_text == expected_text
+    assert edit.edit_pos == expected_pos
+    if expected_text != "abcdefgh":
+        edit.undo()
+        assert edit.edit_text == "abcdefgh"
+
+
+def test_repeat_count_binding_can_be_removed():
+    edit = ReadlineEdit(edit_text="abc", edit_pos=0)
+    del edit.keymap["meta 3"]
+    assert edit.keypress(edit.size, "meta 3") == "meta 3"
+    edit.keymap["meta 4"] = edit.kill_word
+    assert edit.keypress(edit.size, "meta 4") is None
+    assert edit.edit_text == ""
+
+
+@pytest.mark.parametrize(
+    "keys, expected_returned, expected_text",
+    [
+        (["ctrl x", "ctrl q"], [None, "ctrl q"], "abcd"),
+        (["ctrl x", "a"], [None, "a"], "abcd"),
+        # The repeat count is dropped along with the chord.
+        (
+            ["meta 2", "ctrl x", "down", "ctrl d"],
+            [None, None, "down", None],
+            "bcd",
+        ),
+    ],
+)
+def test_unbound_chord_key_is_passed_on(
+    keys, expected_returned, expected_text
+):
+    edit = ReadlineEdit(edit_text="abcd", edit_pos=0)
+    returned = [edit.keypress(edit.size, key) for key in keys]
+    assert returned == expected_returned
+    assert edit.edit_text == expected_text
+
+
+def test_unbound_ctrl_x_is_passed_on():
+    edit = ReadlineEdit()
+    edit.keymap = {"ctrl a": edit.beginning_of_line}
+    assert edit.keypress(edit.size, "ctrl x") == "ctrl x"
+    assert edit.keypress(edit.size, "a") is None
+    assert edit.edit_text == "a"
+
+
+def test_repeat_count_kill_word():
+    edit = ReadlineEdit(edit_text="one two three four", edit_pos=0)
+    for key in ["meta 2", "meta d"]:
+        edit.keypress(edit.size, key)
+    assert edit.edit_text == "three four"
+    assert edit._paste_buffer == ["one two "]
+
+
+def test_chord():
+    edit = ReadlineEdit()
+    for key in "abc":
+        edit.keypress(edit.size, key)
+    edit.keypress(edit.size, "ctrl x")
+    assert edit.edit_text == "abc"
+    edit.keypress(edit.size, "ctrl u")
+    assert edit.edit_text == "ab"
+
+    calls = []
+    edit.keymap[("ctrl x", "ctrl e")] = lambda: calls.append(True)
+    edit.keypress(edit.size, "ctrl x")
+    edit.keypress(edit.size, "ctrl e")
+    assert calls == [True]
+    assert edit.edit_text == "ab"
+
+
+def test_chord_timeout(clock):
+    edit = ReadlineEdit(edit_text="ab")
+    edit.keypress(edit.size, "ctrl x")
+    clock.now += edit.chord_timeout + 1
+    edit.keypress(edit.size, "ctrl u")
+    assert edit.edit_text == ""
+
+
+def test_single_key_binding_wins_over_chord():
+    edit = ReadlineEdit()
+    edit.keymap = {"ctrl x": edit.clear_screen, ("ctrl x", "a"): edit.undo}
+    edit.keypress(edit.size, "b")
+    edit.keypress(edit.size, "ctrl x")
+    assert edit.edit_text == ""
+    assert edit.keypress(edit.size, "a") is None
+    assert edit.edit_text == "a"
+
+
+@pytest.mark.parametrize(
+    "keys, expected_text, expected_pos",
+    [
+        (["meta u"], "FOO bar baz", 3),
+        (["meta 2", "meta u"], "FOO BAR baz", 7),
+        (["meta f", "meta c"], "foo Bar baz", 7),
+        (["meta f", "meta 2", "meta c"], "foo Bar Baz", 11),
+        (["meta f", "meta l"], "foo bar baz", 7),
+    ],
+)
+def test_word_case(keys, expected_text, expected_pos):
+    edit = ReadlineEdit(edit_text="foo bar baz", edit_pos=0)
+    for key in keys:
+        edit.keypress(edit.size, key)
+    assert edit.edit_text == expected_text
+    assert edit.edit_pos == expected_pos
+
+
+def test_mark_follows_edits():
+    edit = ReadlineEdit(edit_text="abc def", edit_pos=4)
+    edit.keypress(edit.size, "<0>")
+    assert edit.mark == 4
+    edit.keypress(edit.size, "ctrl a")
+    edit.keypress(edit.size, "x")
+    assert edit.mark == 5
+    assert edit.region == (1, 5)
+    edit.keypress(edit.size, "ctrl x")
+    edit.keypress(edit.size, "ctrl x")
+    assert edit.edit_pos == 5
+    assert edit.mark == 1
+    edit.keypress(edit.size, "ctrl x")
+    edit.keypress(edit.size, "ctrl l")
+    edit.upcase_region()
+    assert edit.edit_text == "xABC def"
+    edit.undo()
+    assert edit.edit_text == "xabc def"
+
+
+@pytest.mark.parametrize(
+    "text, mark, pos, operation, expected_text",
+    [
+        ("a\nb\nc", 0, 3, "indent_region", "    a\n    b\nc"),
+        ("a\n\nc", 0, 4, "indent_region", "    a\n\n    c"),
+        ("a\nb\nc", 0, 2, "indent_region", "    a\nb\nc"),
+        ("a\nb\nc", None, 2, "indent_region", "a\n    b\nc"),
+        ("    a\n\tb\n  c", 0, 12, "dedent_region", "a\nb\nc"),
+        ("c\nb\na\nz", 0, 5, "sort_lines", "a\nb\nc\nz"),
+        ("one\n  two\n  three", 0, 17, "join_lines", "one two three"),
+        ("one\n  two\nthree", None, 1, "join_lines", "one two\nthree"),
+        ("one", None, 1, "join_lines", "one"),
+    ],
+)
+def test_line_operations(text, mark, pos, operation, expected_text):
+    edit = ReadlineEdit(edit_text=text, edit_pos=pos, multiline=True)
+    if mark is not None:
+        edit.set_mark(mark)
+    getattr(edit, operation)()
+    assert edit.edit_text == expected_text
+    if text != expected_text:
+        assert edit._undo_buffer.pos == 1
+        edit.undo()
+        assert edit.edit_text == text
+
+
+def _type_later(edit, *keys):
+    loop = asyncio.get_running_loop()
+    for key in keys:
+        loop.call_soon(edit.keypress, edit.size, key)
+
+
+@pytest.mark.parametrize(
+    "multiline, submit_key, keys, expected_text",
+    [
+        (False, None, ["a", "b", "enter"], "ab"),
+        (True, None, ["a", "enter", "b", "meta enter"], "a\nb"),
+        (True, "ctrl d", ["a", "ctrl d"], "a"),
+    ],
+)
+def test_read_input(multiline, submit_key, keys, expected_text):
+    edit = ReadlineEdit(multiline=multiline)
+
+    async def main():
+        _type_later(edit, *keys)
+        return await edit.read_input(submit_key=submit_key)
+
+    assert asyncio.run(main()) == expected_text
+    assert edit._input_future is None
+
+
+def test_read_input_many_prompts():
+    edits = [ReadlineEdit() for _ in range(200)]
+
+    async def main():
+        reads = asyncio.gather(*(edit.read_input() for edit in edits))
+        await asyncio.sleep(0)
+        for i, edit in enumerate(edits):
+            _type_later(edit, *str(i), "enter")
+        return await reads
+
+    assert asyncio.run(main()) == [str(i) for i in range(200)]
+
+
+def test_read_input_timeout():
+    edit = ReadlineEdit(multiline=True)
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await edit.read_input(submit_key="enter", timeout=0.01)
+
+    asyncio.run(main())
+    edit.keypress(edit.size, "enter")
+    assert edit.edit_text == "\n"
+
+
+def test_read_input_cancel():
+    edit = ReadlineEdit()
+
+    async def main():
+        task = asyncio.ensure_future(edit.read_input())
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError):
+            await edit.read_input()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert edit.keypress(edit.size, "enter") == "enter"
+
+        task = asyncio.ensure_future(edit.read_input())
+        await asyncio.sleep(0)
+        edit.reset("x")
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+
+
+def test_autocomplete_cache(make_completer):
+    completer = make_completer(["alpha", "almond", "beta"])
+    edit = ReadlineEdit(edit_text="al", edit_pos=2)
+    edit.enable_autocomplete(completer, cache=CompletionCache())
+    edit.keypress(edit.size, "shift tab")
+    assert edit.edit_text == "almond"
+    assert len(completer.calls) == 3
+    for _ in range(4):
+        edit.keypress(edit.size, "backspace")
+    edit.keypress(edit.size, "tab")
+    edit.keypress(edit.size, "tab")
+    edit.keypress(edit.size, "tab")
+    assert edit.edit_text == "al"
+    assert len(completer.calls) == 3
+
+
+def test_completion_prefetch(loop, clock, make_completer):
+    completer = make_completer(["alpha", "almond", "beta"])
+    cache = CompletionCache()
+    edit = ReadlineEdit()
+    with pytest.raises(RuntimeError):
+        edit.enable_completion_prefetch(loop)
+    edit.enable_autocomplete(completer, cache=cache)
+    edit.enable_completion_prefetch(loop, delay=0.5)
+    edit.keypress(edit.size, "a")
+    clock.now = 0.25
+    edit.keypress(edit.size, "l")
+    assert len(loop.alarms) == 1
+    loop.run_alarms(until=0.5)
+    assert (completer, "al") not in cache
+    assert len(loop.alarms) == 1
+    loop.run_alarms()
+    # The completer runs in a background thread.
+    assert (completer, "al") not in cache
+    loop.run_pipes(timeout=10)
+    assert (completer, "al") in cache
+    edit.keypress(edit.size, "tab")
+    assert edit.edit_text == "alpha"
+    assert len(completer.calls) == 3
+
+    edit.keypress(edit.size, "x")
+    edit.disable_completion_prefetch()
+    assert loop.alarms == []
+
+
+def test_completion_prefetch_runs_off_ui_thread(loop, make_completer):
+    completer = make_completer(["alpha", "almond"])
+    threads = []
+
+    def complete(text, state):
+        threads.append(threading.current_thread())
+        return completer(text, state)
+
+    cache = CompletionCache()
+    edit = ReadlineEdit()
+    edit.enable_autocomplete(complete, cache=cache)
+    edit.enable_completion_prefetch(loop, delay=0.5)
+    edit.keypress(edit.size, "a")
+    loop.run_alarms()
+    assert (complete, "a") not in cache
+    loop.run_pipes(timeout=10)
+    assert len(completer.calls) == 3
+    assert threading.current_thread() not in threads
+    edit.keypress(edit.size, "tab")
+    assert edit.edit_text == "alpha"
+    assert len(completer.calls) == 3
+
+
+class SubmittingCompleter:
+    """Ranks in the background; the test resolves the futures."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def __call__(self, text, state):
+        raise AssertionError("completer called on the UI path")
+
+    def submit(self, text):
+        future = concurrent.futures.Future()
+        self.submitted.append((text, future))
+        return future
+
+
+def test_background_completion(loop):
+    completer = SubmittingCompleter()
+    edit = ReadlineEdit(edit_text="x al", edit_pos=4)
+    edit.enable_autocomplete(completer, loop=loop)
+    assert edit.keypress(edit.size, "tab") is None
+    assert edit.edit_text == "x al"
+    # Tab presses while ranking runs move through the pending candidates.
+    edit.keypress(edit.size, "tab")
+    assert [text for text, _future in completer.submitted] == ["al"]
+    completer.submitted[0][1].set_result(["alpha", "almond"])
+    loop.run_pipes()
+    assert edit.edit_text == "x almond"
+    edit.keypress(edit.size, "shift tab")
+    assert edit.edit_text == "x alpha"
+    assert len(completer.submitted) == 1
+    edit.enable_autocomplete(completer)
+    assert loop.pipes == {}
+
+
+def test_background_completion_after_edit(loop):
+    completer = SubmittingCompleter()
+    cache = CompletionCache()
+    edit = ReadlineEdit(edit_text="al", edit_pos=2)
+    edit.enable_autocomplete(completer, cache=cache, loop=loop)
+    edit.keypress(edit.size, "tab")
+    edit.keypress(edit.size, "m")
+    completer.submitted[0][1].set_result(["alpha", "almond"])
+    loop.run_pipes()
+    assert edit.edit_text == "alm"
+    assert cache.candidates(completer, "al") == ["alpha", "almond"]
+    edit.keypress(edit.size, "tab")
+    assert completer.submitted[1][0] == "alm"
+
+
+def test_process_pool_completion_does_not_block(loop):
+    edit = ReadlineEdit(edit_text="gv", edit_pos=2)
+    with ProcessPoolCompleter(["get_value", "GetValue"], shards=2) as pool:
+        edit.enable_autocomplete(pool, loop=loop)
+        assert edit.keypress(edit.size, "tab") is None
+        assert edit.edit_text == "gv"
+        loop.run_pipes(timeout=30)
+    assert edit.edit_text == "GetValue"
+
+
+@pytest.mark.parametrize(
+    "max_wait, key_times, expected",
+    [
+        (None, [0, 0.125, 0.25, 0.375], [(0.875, "abcd")]),
+        (None, [0, 1], [(0.5, "a"), (1.5, "ab")]),
+        (
+            0.75,
+            [0, 0.125, 0.375, 0.625, 1, 1.25],
+            [(0.75, "abcd"), (1.75, "abcdef")],
+        ),
+    ],
+)
+def test_settled_signal(loop, clock, max_wait, key_times, expected):
+    edit = ReadlineEdit()
+    settled = []
+    urwid.connect_signal(
+        edit, "settled", lambda w, text: settled.append((clock.now, text))
+    )
+    edit.enable_settled_signal(loop, delay=0.5, max_wait=max_wait)
+    for key_time in key_times:
+        loop.run_alarms(until=key_time)
+        edit.keypress(edit.size, "abcdef"[len(edit.edit_text)])
+    loop.run_alarms()
+    assert settled == expected
+
+
+def test_settled_signal_disable(loop):
+    edit = ReadlineEdit()
+    settled = []
+    urwid.connect_signal(edit, "settled", lambda w, t: settled.append(t))
+    edit.enable_settled_signal(loop, delay=0)
+    edit.keypress(edit.size, "a")
+    edit.keypress(edit.size, "b")
+    assert len(loop.alarms) == 1
+    loop.run_alarms()
+    assert settled == ["ab"]
+    edit.keypress(edit.size, "c")
+    edit.disable_settled_signal()
+    assert loop.alarms == []
+    assert settled == ["ab"]
+
+
+def _apply_splices(text, splices):
+    for start, removed, inserted in reversed(splices):
+        assert text[start : start + len(removed)] == removed
+        text = text[:start] + inserted + text[start + len(removed) :]
+    return text
+
+
+@pytest.mark.parametrize(
+    "old, new, expected",
+    [
+        ("a\nb\nc\n", "a\nb\nc\n", []),
+        ("a\nb\nc\n", "a\nB\nc\n", [(2, "b\n", "B\n")]),
+        ("a\nb\nc", "a\nb\nC", [(4, "c", "C")]),
+        ("a\nb\nc\n", "a\nc\n", [(2, "b\n", "")]),
+        ("a\nb\n", "x\na\nb\ny\n", [(0, "", "x\n"), (4, "", "y\n")]),
+        ("ab\nab\nab\n", "ab\nab\n", [(6, "ab\n", "")]),
+        ("", "new\n", [(0, "", "new\n")]),
+    ],
+)
+def test_line_diff(old, new, expected):
+    splices = _line_diff(old, new)
+    assert splices == expected
+    assert _apply_splices(old, splices) == new
+
+
+def _editor(script):
+    return "%s -c %s" % (
+        sys.executable,
+        shlex.quote(
+            "import sys\n"
+            "path = sys.argv[1]\n"
+            "text = open(path, newline='').read()\n" + script
+        ),
+    )
+
+
+def test_edit_externally(loop):
+    lines = ["line %d\n" % i for i in range(1000)]
+    edit = ReadlineEdit(edit_text="".join(lines), multiline=True)
+    edit.set_edit_pos(len("".join(lines[:500])) + 3)
+    edit.enable_external_editor(
+        loop,
+        _editor(
+            "text = 'top\\n' + text.replace('line 10\\n', 'line ten\\n')\n"
+            "open(path, 'w', newline='').write(text.replace('line 999\\n', ''))"
+        ),
+    )
+    edit.keypress(edit.size, "ctrl x")
+    edit.keypress(edit.size, "ctrl e")
+    assert loop.screen_calls == ["stop", "start"]
+    lines[10] = "line ten\n"
+    expected = "top\n" + "".join(lines[:-1])
+    assert edit.edit_text == expected
+    assert edit.edit_text[edit.edit_pos - 3 :].startswith("line 500\n")
+    assert edit._undo_buffer.pos == 1
+    assert edit._undo_buffer.cur.splices == (
+        (8881, "line 999\n", ""),
+        (70, "line 10\n", "line ten\n"),
+        (0, "", "top\n"),
+    )
+    edit.undo()
+    assert edit.edit_text == "".join(lines[:10] + ["line 10\n"] + lines[11:])
+
+
+@pytest.mark.parametrize(
+    "script",
+    ["sys.exit(1)", "open(path, 'w').write(text)"],
+)
+def test_edit_externally_without_changes(loop, script):
+    edit = ReadlineEdit(edit_text="text", edit_pos=2)
+    edit.edit_externally()
+    edit.enable_external_editor(loop, _editor(script))
+    edit.edit_externally()
+    assert edit.edit_text == "text"
+    assert edit.edit_pos == 2
+    assert edit._undo_history is None
+
+
+def test_apply_line_diff_merges_many_changes():
+    old = "".join("%d\n" % i for i in range(200))
+    new = "".join("%d\n" % (i if i % 2 else -i) for i in range(200))
+    edit = ReadlineEdit(edit_text=old, multiline=True)
+    edit.set_edit_pos(len(old))
+    edit._apply_line_diff(old, new)
+    assert edit.edit_text == new
+    assert edit.edit_pos == len(new)
+    assert len(edit._undo_buffer.cur.splices) == 1
@@ -0,0 +1,68 @@
+import pytest
+
+from urwid_readline import ReadlineEdit
+
+
+def compl(text, state):
+    return None
+
+
+def _type(edit, keys):
+    for key in keys:
+        edit.keypress(edit.size, key)
+
+
+def test_roundtrip():
+    edit = ReadlineEdit(multiline=True)
+    edit.enable_autocomplete(compl, key="ctrl o")
+    edit.set_completer_delims(" ")
+    _type(edit, ["a", "b", "enter", "c", "d", "ctrl u", "e", "left"])
+    data = edit.export_state()
+
+    restored = ReadlineEdit(multiline=True)
+    restored.import_state(
+        data, completers={"urwid_readline.test_state:compl": compl}
+    )
+    assert restored.edit_text == "ab\ne"
+    assert restored.edit_pos == 3
+    assert restored._paste_buffer == ["cd"]
+    assert restored._autocomplete_func is compl
+    assert restored._autocomplete_key == "ctrl o"
+    assert restored._autocomplete_delims == " "
+    assert restored._undo_history is None
+
+    for expected in ["ab\n", "ab\ncd", "ab\nc", "ab\n", "ab", "a", ""]:
+        restored.undo()
+        assert restored.edit_text == expected
+
+
+def test_incremental_updates():
+    edit = ReadlineEdit(edit_text="x" * 10000)
+    data = edit.export_state()
+    edit.edit_pos = 5000
+    _type(edit, ["a", "b", "backspace"])
+    update = edit.export_state_update()
+    assert len(update) < 500
+    data += update
+    _type(edit, ["ctrl _", "ctrl _", "ctrl k", "c"])
+    data += edit.export_state_update()
+    data += edit.export_state_update()
+
+    restored = ReadlineEdit()
+    restored.import_state(data)
+    assert restored.edit_text == edit.edit_text
+    assert restored.edit_pos == edit.edit_pos
+    assert restored._paste_buffer == edit._paste_buffer
+    while edit._undo_buffer.pos:
+        edit.undo()
+        restored.undo()
+        assert restored.edit_text == edit.edit_text
+    assert restored.edit_text == "x" * 10000
+
+
+@pytest.mark.parametrize(
+    "data", ["", "something else\n", "urwid_readline-state 99\n"]
+)
+def test_invalid_snapshot(data):
+    with pytest.raises(ValueError):
+        ReadlineEdit().import_state(data)
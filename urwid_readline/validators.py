@@ -0,0 +1,78 @@
+import re
+
+
+class Validator:
+    """Base class for edit constraints.
+
+    Every mutation of a ReadlineEdit is described as a splice: the text
+    between ``start`` and ``end`` gets replaced with ``text``. Incremental
+    validators only look at that delta; the others are handed the whole
+    text the edit would produce.
+    """
+
+    incremental = True
+
+    def check(self, edit_text, start, end, text):
+        """Return the text to insert (possibly shortened) or None to reject
+        the edit."""
+        return text
+
+    def check_text(self, new_text):
+        """Whole-text check used by non-incremental validators."""
+        return True
+
+
+class MaxLengthValidator(Validator):
+    """Shortens insertions so that the text never grows past ``max_char``.
+
+    Deletions are always allowed, even if the text is already too long.
+    """
+
+    def __init__(self, max_char):
+        self.max_char = max_char
+
+    def check(self, edit_text, start, end, text):
+        chars_left = self.max_char - (len(edit_text) - (end - start))
+        if len(text) > chars_left:
+            return text[: max(chars_left, 0)]
+        return text
+
+
+class CharsetValidator(Validator):
+    """Rejects edits that insert characters outside of ``allowed_chars``."""
+
+    def __init__(self, allowed_chars):
+        self.allowed_chars = frozenset(allowed_chars)
+
+    def check(self, edit_text, start, end, text):
+        if not self.allowed_chars.issuperset(text):
+            return None
+        return text
+
+
+class RegexValidator(Validator):
+    """Rejects edits whose resulting text does not fully match ``pattern``.
+
+    Keep in mind that the pattern has to accept every intermediate state
+    the user types through, not just the final value.
+    """
+
+    incremental = False
+
+    def __init__(self, pattern, flags=0):
+        self.regex = re.compile(pattern, flags)
+
+    def check_text(self, new_text):
+        return self.regex.fullmatch(new_text) is not None
+
+
+class CallableValidator(Validator):
+    """Wraps a plain ``func(new_text) -> bool`` predicate."""
+
+    incremental = False
+
+    def __init__(self, func):
+        self.func = func
+
+    def check_text(self, new_text):
+        return bool(self.func(new_text))